@@ -3,3 +3,4 @@
 from . import golden_ratio
 from . import rule_of_fifths
 from . import rule_of_thirds
+from . import batch
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+
+'''
+Evaluate many contestants' faces at once
+
+Rather than decoding each face image to read its shape and indexing into one 68x2 landmark
+matrix at a time, take an (N, 68, 2) landmark tensor along with the face heights and widths
+stored in data set 5 and evaluate every algorithm with whole-array operations. The results
+match the per-face evaluate() functions exactly.
+'''
+
+from . import golden_ratio
+from . import rule_of_fifths
+from . import rule_of_thirds
+import numpy as np
+
+# Algorithm modules keyed by their command line names
+ALGORITHMS = {
+    'thirds': rule_of_thirds,
+    'fifths': rule_of_fifths,
+    'golden': golden_ratio
+}
+
+def stack_landmarks(dlib_landmarks):
+    # Convert an iterable of 68x2 landmark lists (i.e. the dlib_landmarks column) to an (N, 68, 2) tensor
+    # (vstack also accepts the arrays of row arrays that columnar storage returns for nested lists)
+    landmarks = np.array([np.vstack(l) for l in dlib_landmarks], dtype=np.int64)
+    if landmarks.size == 0:
+        landmarks = landmarks.reshape(0, 68, 2)
+    return landmarks
+
+def evaluate(landmarks, heights, widths, algorithms=ALGORITHMS.keys()):
+    # Return a dict of result columns (NumPy arrays of length N) for every given algorithm
+    landmarks = np.asarray(landmarks)
+    results = {}
+    for name in algorithms:
+        results.update(ALGORITHMS[name].evaluate_batch(landmarks, heights, widths))
+    return results
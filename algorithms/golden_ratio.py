@@ -46,8 +46,11 @@ Meisner, G. (2020, September 28). Meisner Beauty Guide for Golden Ratio Facial A
 +-----------+------------------+-----------------------+------------------------+
 '''
 
+import numpy as np
 import math
-import cv2
+
+# Version of this algorithm's results (bump whenever evaluate or evaluate_batch changes them, invalidating cached results)
+VERSION = 1
 
 def percent_error(experimental, theoretical):
     if theoretical != 0:
@@ -72,6 +75,14 @@ def find_ratio(m1, m2):
         else:
             return 0
 
+def find_ratios(m1, m2):
+    # Vectorized find_ratio: divide the greater measurement by the smaller, 0 where the smaller is 0
+    m1 = np.asarray(m1, dtype=float)
+    m2 = np.asarray(m2, dtype=float)
+    greater = np.where(m1 > m2, m1, m2)
+    smaller = np.where(m1 > m2, m2, m1)
+    return np.divide(greater, smaller, out=np.zeros_like(greater), where=smaller > 0)
+
 def evaluate(face_img, landmarks):
     # Get contestant
     golden_ratio = (1+math.sqrt(5))/2
@@ -179,3 +190,58 @@ def evaluate(face_img, landmarks):
     ratios['h7_ratio'] = float(find_ratio(abs(landmarks[48,0]-landmarks[52,0]), abs(landmarks[52,0]-landmarks[54,0])))
 
     return ratios
+
+
+def evaluate_batch(landmarks, heights, widths):
+    # Evaluate an (N, 68, 2) landmark tensor and the matching face heights/widths at once
+    # Mirrors evaluate() operation for operation so that results are identical
+    h = np.asarray(heights)
+    w = np.asarray(widths)
+    x = landmarks[:, :, 0]
+    y = landmarks[:, :, 1]
+
+    # Perform useful calculations for ratio evaluation:
+    # * Center of eyes (top left and bottom right points of each eye, then midpoint formula)
+    right_top_y = np.minimum(y[:, 37], y[:, 38])
+    right_bottom_y = np.maximum(y[:, 41], y[:, 40])
+    left_top_y = np.minimum(y[:, 43], y[:, 44])
+    left_bottom_y = np.maximum(y[:, 47], y[:, 46])
+    eye_right_center_y = (right_top_y + right_bottom_y)/2
+    eye_left_center_y = (left_top_y + left_bottom_y)/2
+    eyes_center_y = (eye_right_center_y+eye_left_center_y)/2
+    # Top of eyebrows
+    eyebrows_top_y = (y[:, 19]+y[:, 24])/2
+    # Top and bottom of eyes
+    eyes_top_y = (right_top_y+left_top_y)/2
+    eyes_bottom_y = (right_bottom_y+left_bottom_y)/2
+
+    # * Lips
+    lips_top_y = np.minimum(y[:, 51], y[:, 53])
+    lips_bottom_y = y[:, 57]
+    lips_center_y = (lips_top_y+lips_bottom_y)/2
+
+    # * Nose
+    nostrils_y = (y[:, 31]+y[:, 35])/2
+    nose_bulb_y = y[:, 30]
+    nose_bottom_y = y[:, 33]
+
+    return {
+        # HEAD RATIO
+        'hw_ratio': find_ratios(h, w),
+        # VERTICAL RATIOS
+        'v1_ratio': find_ratios(np.abs(eyes_center_y-lips_center_y), np.abs(lips_center_y-h)),
+        'v2_ratio': find_ratios(np.abs(eyes_center_y-nostrils_y), np.abs(nostrils_y-h)),
+        'v3_ratio': find_ratios(np.abs(eyes_center_y-nose_bulb_y), np.abs(nose_bulb_y-nose_bottom_y)),
+        'v4_ratio': find_ratios(np.abs(eyebrows_top_y-eyes_top_y), np.abs(eyes_top_y-eyes_bottom_y)),
+        'v5_ratio': find_ratios(np.abs(eyes_center_y-nostrils_y), np.abs(nostrils_y-lips_center_y)),
+        'v6_ratio': find_ratios(np.abs(lips_top_y-lips_center_y), np.abs(lips_center_y-lips_bottom_y)),
+        'v7_ratio': find_ratios(np.abs(nostrils_y-lips_top_y), np.abs(lips_top_y-lips_center_y)),
+        # HORIZONTAL RATIOS
+        'h1_ratio': find_ratios(x[:, 39], np.abs(x[:, 39]-w)),
+        'h2_ratio': find_ratios(x[:, 39], np.abs(x[:, 39]-x[:, 42])),
+        'h3_ratio': find_ratios(np.abs((w/2)-x[:, 36]), x[:, 36]),
+        'h4_ratio': find_ratios(x[:, 36], np.abs(x[:, 36]-x[:, 39])),
+        'h5_ratio': find_ratios(x[:, 17], np.abs(x[:, 17]-x[:, 36])),
+        'h6_ratio': find_ratios(np.abs((w/2)-x[:, 35]), np.abs(x[:, 35]-x[:, 54])),
+        'h7_ratio': find_ratios(np.abs(x[:, 48]-x[:, 52]), np.abs(x[:, 52]-x[:, 54]))
+    }
@@ -6,7 +6,10 @@ Take in a face image and evaluate how well it fits the rule of fifths:
     of one eye."
 '''
 
-import cv2
+import numpy as np
+
+# Version of this algorithm's results (bump whenever evaluate or evaluate_batch changes them, invalidating cached results)
+VERSION = 1
 
 def evaluate(face_img, landmarks):
     # Create fifths variable
@@ -36,3 +39,23 @@ def evaluate(face_img, landmarks):
 
     # Return results
     return fifths
+
+
+def evaluate_batch(landmarks, heights, widths):
+    # Evaluate an (N, 68, 2) landmark tensor and the matching face heights/widths at once
+    widths = np.asarray(widths)
+    x = landmarks[:, :, 0]
+
+    # Find the average width of the two eyes, this is our theoretical width of each 1/5 section
+    right_eye_width = x[:, 39]-x[:, 36]
+    left_eye_width = x[:, 45]-x[:, 42]
+
+    # Get the widths of the five sections of the contestants' faces (left to right)
+    return {
+        'theoretical_fifths': ((right_eye_width+left_eye_width)/2).astype(float),
+        'experimental_fifths1': x[:, 36].astype(float),
+        'experimental_fifths2': np.abs(x[:, 36]-x[:, 39]).astype(float),
+        'experimental_fifths3': np.abs(x[:, 39]-x[:, 42]).astype(float),
+        'experimental_fifths4': np.abs(x[:, 42]-x[:, 45]).astype(float),
+        'experimental_fifths5': np.abs(x[:, 45]-widths).astype(float)
+    }
@@ -6,7 +6,10 @@ Take in a face image and evaluate how well it fits the rule of thirds:
     through the forehead hairline, the brow, the base of the nose, and the edge of the chin"
 '''
 
-import cv2
+import numpy as np
+
+# Version of this algorithm's results (bump whenever evaluate or evaluate_batch changes them, invalidating cached results)
+VERSION = 1
 
 def evaluate(face_img, landmarks):
     # Create thirds variable
@@ -46,3 +49,29 @@ def evaluate(face_img, landmarks):
 
     # Return results
     return thirds
+
+
+def evaluate_batch(landmarks, heights, widths):
+    # Evaluate an (N, 68, 2) landmark tensor and the matching face heights/widths at once
+    # Mirrors evaluate() operation for operation so that results are identical
+    heights = np.asarray(heights)
+    x = landmarks[:, :, 0]
+    y = landmarks[:, :, 1]
+
+    # Save measurement of three equal parts of face
+    theoretical = heights/3
+
+    # Get midpoint of eyebrows (the right bottom left point always takes landmark 17's height)
+    right_center_y = (y[:, 19]+y[:, 17])/2
+    left_center_y = (y[:, 24]+np.maximum(y[:, 22], y[:, 26]))/2
+    # Get height distance from top of image to eyebrow midpoint
+    experimental1 = (right_center_y+left_center_y)/2
+
+    return {
+        'theoretical_thirds': theoretical.astype(float),
+        'experimental_thirds1': experimental1.astype(float),
+        # Get height distance from eyebrows to bottom of nose
+        'experimental_thirds2': (y[:, 33]-experimental1).astype(float),
+        # Get height distance from bottom of nose to chin (bottom of image)
+        'experimental_thirds3': (heights-y[:, 33]).astype(float)
+    }
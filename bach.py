@@ -0,0 +1,176 @@
+#!/usr/bin/env python
+
+'''
+Single entry point for every stage of the project
+    * collect: collect data sets 1-4 (see collect.py)
+    * transform: preprocess data set 5 and evaluate it (see transform.py)
+    * evaluate: evaluate data set 5 with the algorithms (see evaluate.py)
+    * stream: collect and transform everything as one streaming task graph (see stream.py)
+    * inspect: summarize the data sets, journals, work queue, result cache, and metrics in the volume
+Only argparse is imported until a subcommand's arguments are parsed, then only the modules (and
+libraries, i.e. pandas, OpenCV, and dlib) that the subcommand needs, so --help returns immediately
+'''
+
+import importlib
+import argparse
+import json
+import os
+
+# Face detector backends (the keys of vision.detectors.BACKENDS, which imports OpenCV; transform.py checks they match)
+DETECTORS = ['cascade', 'hog', 'dnn']
+
+'''
+Arguments of each subcommand (the scripts parse the same arguments when they're run directly)
+'''
+def collect_arguments(parser):
+    parser.add_argument('--dataset', dest='dataset', type=int, nargs='+', default=[1, 2, 3, 4], help='an integer associated with a data set (i.e. 4)')
+    parser.add_argument('--season', dest='season', type=int, nargs='+', default=[], help='an integer season (only applicable with data source 2) (i.e. 11)')
+    parser.add_argument('--contestant', dest='contestant', type=str, nargs='+', default=[], help='a string contestant first and last name separated by "_" (only applicable with data sources 3 and 4) (i.e. joelle_fletcher)')
+    parser.add_argument('--rate', dest='rate', type=float, default=1.0, help='the maximum number of requests per second to any one host (i.e. 0.5)')
+    parser.add_argument('--concurrency', dest='concurrency', type=int, default=16, help='the maximum number of requests in flight at once (i.e. 16)')
+    parser.add_argument('--resume', dest='resume', action='store_true', help='resume an interrupted collection, skipping data sets already collected and work items already journaled')
+    parser.add_argument('--max-edge', dest='max_edge', type=int, default=0, help='the longest edge in pixels that downloaded photos are downscaled to before they are stored (i.e. 1024); photos are kept as downloaded by default')
+    parser.add_argument('--jpeg-quality', dest='jpeg_quality', type=int, default=90, help='the JPEG quality that downscaled photos are re-encoded at (i.e. 90)')
+    parser.add_argument('--offline', dest='offline', action='store_true', help='serve every request from the response cache without network access')
+    parser.add_argument('--retries', dest='retries', type=int, default=2, help='the number of times a request that times out, fails to connect, or is throttled is retried, after a jittered exponential backoff (i.e. 2)')
+
+def evaluate_arguments(parser):
+    parser.add_argument('--algorithm', dest='algorithm', type=str, nargs='+', default=['thirds','fifths','golden'], help='a string algorithm name to perform (thirds, fifths, and/or golden)')
+    parser.add_argument('--contestant', dest='contestant', type=str, nargs='+', default=[], help='a string contestant first and last name separated by "_" (i.e. joelle_fletcher)')
+    parser.add_argument('--no-cache', dest='no_cache', action='store_true', help='preprocess and evaluate every contestant instead of reusing the cached results of unchanged photos and faces')
+
+def transform_arguments(parser):
+    parser.add_argument('--preprocess', dest='preprocess', action='store_true', help='preprocess the data (rotate, crop, and identify dlib landmarks) for data set 5')
+    parser.add_argument('--evaluate', dest='evaluate', action='store_true', help='evaluate data set 5 with the algorithms')
+    evaluate_arguments(parser)
+    parser.add_argument('--detector', dest='detector', type=str, choices=DETECTORS, default='cascade', help='the face detector backend (cascade, hog, or dnn)')
+    parser.add_argument('--workers', dest='workers', type=int, default=os.cpu_count(), help='the number of processes preprocessing photos (i.e. 8); one per core by default')
+    parser.add_argument('--chunksize', dest='chunksize', type=int, default=1, help='the number of photos sent to a process at once (i.e. 4)')
+    parser.add_argument('--window', dest='window', type=int, default=0, help='the maximum number of chunks in flight at once (i.e. 16); twice the number of workers by default')
+    parser.add_argument('--working-size', dest='working_size', type=int, default=0, help='the longest edge in pixels that photos are downsampled to for face detection (i.e. 640); full resolution by default')
+    parser.add_argument('--enqueue', dest='enqueue', action='store_true', help='fill the work queue with preprocessing (or, with only --evaluate, evaluation) tasks instead of running them')
+    parser.add_argument('--worker', dest='worker', action='store_true', help='run --workers processes that claim and run tasks from the work queue until it is empty')
+    parser.add_argument('--compact', dest='compact', action='store_true', help='save the results of finished work queue tasks to data set 5')
+    parser.add_argument('--queue', dest='queue', type=str, default=None, help='the path of the SQLite work queue shared by workers (i.e. on a shared volume); data/queue.sqlite3 by default')
+    parser.add_argument('--lease', dest='lease', type=float, default=60, help='the seconds a worker holds a task without a heartbeat before it is given to another worker (i.e. 60)')
+    parser.add_argument('--attempts', dest='attempts', type=int, default=3, help='the maximum number of times a work queue task is attempted (i.e. 3)')
+    parser.add_argument('--timeout', dest='timeout', type=float, default=120, help='the seconds a photo may take to preprocess before it is retried, and then reported as failed (i.e. 120); 0 waits forever')
+    parser.add_argument('--retries', dest='retries', type=int, default=2, help='the number of times a photo that fails or times out is retried, after a jittered exponential backoff (i.e. 2)')
+    parser.add_argument('--max-tasks-per-child', dest='max_tasks_per_child', type=int, default=100, help='the number of tasks a worker process runs before it is replaced by a fresh one (i.e. 100); 0 never replaces workers')
+
+def stream_arguments(parser):
+    parser.add_argument('--season', dest='season', type=int, nargs='+', default=[], help='an integer season (i.e. 11); all seasons in data set 1 by default')
+    parser.add_argument('--workers', dest='workers', type=int, default=5, help='the number of processes preprocessing photos (i.e. 5)')
+    parser.add_argument('--rate', dest='rate', type=float, default=1.0, help='the maximum number of requests per second to any one host (i.e. 0.5)')
+    parser.add_argument('--concurrency', dest='concurrency', type=int, default=16, help='the maximum number of requests in flight at once (i.e. 16)')
+    parser.add_argument('--no-instagram', dest='instagram', action='store_false', help='skip data set 4 (and the Instagram profile picture fallback)')
+    parser.add_argument('--detector', dest='detector', type=str, choices=DETECTORS, default='cascade', help='the face detector backend (cascade, hog, or dnn)')
+    parser.add_argument('--working-size', dest='working_size', type=int, default=0, help='the longest edge in pixels that photos are downsampled to for face detection (i.e. 640); full resolution by default')
+    parser.add_argument('--resume', dest='resume', action='store_true', help='resume an interrupted run, skipping work items already journaled')
+    parser.add_argument('--max-edge', dest='max_edge', type=int, default=0, help='the longest edge in pixels that downloaded photos are downscaled to before they are stored (i.e. 1024); photos are kept as downloaded by default')
+    parser.add_argument('--jpeg-quality', dest='jpeg_quality', type=int, default=90, help='the JPEG quality that downscaled photos are re-encoded at (i.e. 90)')
+    parser.add_argument('--offline', dest='offline', action='store_true', help='serve every request from the response cache without network access')
+    parser.add_argument('--timeout', dest='timeout', type=float, default=120, help='the seconds a photo may take to preprocess before it is retried, and then reported as failed (i.e. 120); 0 waits forever')
+    parser.add_argument('--retries', dest='retries', type=int, default=2, help='the number of times a failed request or photo is retried, after a jittered exponential backoff (i.e. 2)')
+    parser.add_argument('--max-tasks-per-child', dest='max_tasks_per_child', type=int, default=100, help='the number of photos a worker process preprocesses before the workers are replaced by fresh ones (i.e. 100); 0 never replaces workers')
+
+def inspect_arguments(parser):
+    parser.add_argument('--dataset', dest='dataset', type=int, default=0, help='an integer associated with a data set to print the records of (i.e. 5)')
+    parser.add_argument('--contestant', dest='contestant', type=str, nargs='+', default=[], help='a string contestant first and last name separated by "_" to print the records of (i.e. joelle_fletcher)')
+
+# Module run by each subcommand (inspect is run here), with its arguments and description
+COMMANDS = {
+    'collect': ('collect', collect_arguments, 'collect data sets 1-4 from remote sources'),
+    'transform': ('transform', transform_arguments, 'preprocess data set 5 and evaluate it with the algorithms'),
+    'evaluate': ('evaluate', evaluate_arguments, 'evaluate data set 5 with the algorithms'),
+    'stream': ('stream', stream_arguments, 'collect and transform everything as one streaming task graph'),
+    'inspect': (None, inspect_arguments, 'summarize the data sets, journals, work queue, result cache, and metrics in the volume')
+}
+
+def parser():
+    parser = argparse.ArgumentParser(prog='bach.py', description='Collect, transform, and evaluate contestant data')
+    subparsers = parser.add_subparsers(dest='command', metavar='command', required=True)
+    for command, (module, arguments, description) in COMMANDS.items():
+        arguments(subparsers.add_parser(command, help=description, description=description))
+    return parser
+
+def parse_args(argv=None):
+    return parser().parse_args(argv)
+
+'''
+Inspect
+'''
+def inspect(args):
+    localdir = os.path.join(os.getcwd(), 'data')
+    if not os.path.exists(localdir):
+        print(f'  💔 {localdir} does not exist. Have any data sets been collected?')
+        return
+    # Print the records of a data set (this is the only part of inspect that needs pandas)
+    if args.dataset:
+        import model
+        bachmodel = model.bachmodel(localdir)
+        df = bachmodel.retrieve_df(args.dataset, landmarks=False)
+        if len(args.contestant) > 0 and 'name' in df.columns:
+            names = [' '.join(name.capitalize() for name in contestant.lower().split('_')[:2]) for contestant in args.contestant]
+            df = df[df['name'].isin(names)]
+        print(f'🌹 Data set {args.dataset}: {len(df.index)} records')
+        for index, record in df.iterrows():
+            print(record.to_string())
+            print()
+        return
+    # Data set files, landmark tensor, and journals
+    print(f'🌹 Data sets in {localdir}')
+    for name in sorted(os.listdir(localdir)):
+        path = os.path.join(localdir, name)
+        if not name.startswith('ds') or not os.path.isfile(path):
+            continue
+        size = f'{os.path.getsize(path) / 2**20:.1f} MB'
+        if name.endswith('.parquet'):
+            import pyarrow.parquet
+            print(f'  📦 {name}: {pyarrow.parquet.read_metadata(path).num_rows} records ({size})')
+        elif name.endswith('.journal'):
+            with open(path, 'r') as f:
+                print(f'  ⏩ {name}: {sum(1 for line in f)} work items journaled ({size})')
+        else:
+            print(f'  📦 {name}: {size}')
+    blobdir = os.path.join(localdir, 'blobs')
+    if os.path.exists(blobdir):
+        blobs = [os.path.join(root, name) for root, dirs, names in os.walk(blobdir) for name in names]
+        print(f'  📦 blobs: {len(blobs)} images ({sum(os.path.getsize(blob) for blob in blobs) / 2**20:.1f} MB)')
+    # Work queue and result cache
+    import sqlite3
+    queue_path = os.path.join(localdir, 'queue.sqlite3')
+    if os.path.exists(queue_path):
+        print('🌹 Work queue')
+        with sqlite3.connect(queue_path) as db:
+            for kind, state, count in db.execute('select kind, state, count(*) from tasks group by kind, state order by kind, state'):
+                print(f'  ⏳ {kind}: {count} {state}')
+    cache_path = os.path.join(localdir, 'results.sqlite3')
+    if os.path.exists(cache_path):
+        print('🌹 Result cache')
+        with sqlite3.connect(cache_path) as db:
+            for namespace, count in db.execute('select namespace, count(*) from results group by namespace order by namespace'):
+                print(f'  📦 {namespace}: {count} results')
+    # Metrics of the last run
+    metrics_path = os.path.join(localdir, 'metrics.json')
+    if os.path.exists(metrics_path):
+        import telemetry
+        with open(metrics_path, 'r') as f:
+            metrics = json.load(f)
+        print('🌹 Metrics of the last run')
+        telemetry.summarize(metrics)
+
+'''
+Main
+'''
+def main(argv=None):
+    args = parse_args(argv)
+    module = COMMANDS[args.command][0]
+    if module is None:
+        inspect(args)
+    else:
+        # Import the subcommand's module (and everything it needs) only now
+        importlib.import_module(module).main(args)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python
+
+'''
+Compare the face detector backends (see vision.detectors) on a labeled set of local photos:
+photos per second and detection recall, so the fastest backend that keeps recall can be chosen
+
+Labels are a JSON object of photo paths (relative to the labels file) and the number of faces
+in each photo; by default every photo in media/ is labeled with one face
+
+    python -m benchmarks.detectors
+    python -m benchmarks.detectors --backend cascade hog --labels path/to/labels.json
+'''
+
+from vision import detectors
+from vision import registry
+from . import faces
+import argparse
+import time
+import json
+import cv2
+import os
+
+def load_labels(path=None):
+    # Photo paths and their number of faces
+    if not path:
+        return {photo: 1 for photo in faces.corpus()}
+    with open(path, 'r') as f:
+        labels = json.load(f)
+    return {os.path.join(os.path.dirname(os.path.abspath(path)), photo): count for photo, count in labels.items()}
+
+def run(backend, imgs, labels):
+    # Seconds per photo and recall (labeled faces found, counting at most the labeled number per photo)
+    detector = detectors.get(backend)
+    found = 0
+    start = time.perf_counter()
+    for img, count in zip(imgs, labels):
+        verified = sum(1 for face, ok in detector.faces(img) if ok)
+        found += min(verified, count)
+    seconds = (time.perf_counter() - start) / max(1, len(imgs))
+    return seconds, found / max(1, sum(labels))
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare the face detector backends\' speed and recall')
+    parser.add_argument('--backend', dest='backend', type=str, nargs='+', default=list(detectors.BACKENDS.keys()), help='a string detector backend (cascade, hog, and/or dnn)')
+    parser.add_argument('--labels', dest='labels', type=str, default=None, help='the path to a JSON object of photo paths and their number of faces')
+    args = parser.parse_args()
+    labels = load_labels(args.labels)
+    imgs = [cv2.imread(photo, cv2.IMREAD_COLOR) for photo in labels]
+    print(f'''{len(imgs)} photos, {sum(labels.values())} labeled faces''')
+    print(f'''{'backend':<10}{'ms/photo':>10}{'photos/sec':>12}{'recall':>8}''')
+    for backend in args.backend:
+        try:
+            registry.load_all(verbose=False, names=detectors.BACKENDS[backend].models)
+        except Exception as e:
+            # Missing packages or model files
+            print(f'  ⚠️  Skipping {backend}: {e}')
+            continue
+        # Warm up before timing
+        run(backend, imgs[:1], list(labels.values())[:1])
+        seconds, recall = run(backend, imgs, list(labels.values()))
+        print(f'''{backend:<10}{seconds*1000:>10.1f}{1/seconds:>12.1f}{recall:>8.1%}''')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+'''
+Benchmark face preprocessing (get_face_rotation, process_face) on a corpus of local face images
+and the attractiveness algorithms on a synthetic landmark corpus
+'''
+
+from algorithms import *
+from vision import detectors
+from vision import registry
+import numpy as np
+import tempfile
+import glob
+import os
+
+MEDIA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'media')
+
+def corpus():
+    # Original and straightened photos of contestants in media/
+    return sorted(glob.glob(os.path.join(MEDIA, '*', 'original.jpeg')) + glob.glob(os.path.join(MEDIA, '*', 'rotated.jpeg')))
+
+def synthetic_landmarks(n=1000, seed=510):
+    rng = np.random.default_rng(seed)
+    return rng.integers(0, 150, size=(n, 68, 2)), np.full(n, 150), rng.integers(90, 140, size=n)
+
+def algorithm_cases():
+    landmarks, heights, widths = synthetic_landmarks()
+    faces = [np.zeros((h, w, 3), np.uint8) for h, w in zip(heights, widths)]
+    cases = {}
+    for name, algorithm in batch.ALGORITHMS.items():
+        cases[f'algorithms.{name}.evaluate'] = lambda algorithm=algorithm: [algorithm.evaluate(face, l) for face, l in zip(faces, landmarks)]
+        cases[f'algorithms.{name}.evaluate_batch'] = lambda algorithm=algorithm: algorithm.evaluate_batch(landmarks, heights, widths)
+    return cases
+
+def load_corpus():
+    # Preprocessing needs dlib and its shape predictor (as installed in the Docker image)
+    # Returns the transform module, a scratch blob store holding the corpus, and the corpus' blob keys
+    try:
+        import transform
+    except ImportError as e:
+        print(f'  ⚠️  Skipping face preprocessing benchmarks: {e}')
+        return None
+    if not os.path.exists(registry.PREDICTOR_PATH):
+        print(f'  ⚠️  Skipping face preprocessing benchmarks: {registry.PREDICTOR_PATH} not found')
+        return None
+    registry.load_all(verbose=False)
+    # Store the corpus in a scratch blob store
+    transform.PATH_TO_VOLUME = tempfile.mkdtemp(prefix='bach-bench-')
+    blobs = transform.model.bachmodel(transform.PATH_TO_VOLUME).blobs
+    keys = []
+    for path in corpus():
+        with open(path, 'rb') as f:
+            keys.append(blobs.put(f.read()))
+    return transform, blobs, keys
+
+def preprocessing_cases():
+    loaded = load_corpus()
+    if not loaded:
+        return {}
+    transform, blobs, keys = loaded
+    imgs = [transform.blob_to_img(blobs, key) for key in keys]
+    return {
+        'faces.decode': lambda: [transform.blob_to_img(blobs, key) for key in keys],
+        'faces.get_face_rotation': lambda: [transform.get_face_rotation(img, detectors.get('cascade')) for img in imgs],
+        'faces.process_face': lambda: [transform.process_face(i, 'Contestant', key) for i, key in enumerate(keys)],
+        'faces.process_face.working_640': lambda: [transform.process_face(i, 'Contestant', key, 640) for i, key in enumerate(keys)]
+    }
+
+def cases():
+    return {**algorithm_cases(), **preprocessing_cases()}
@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+
+'''
+Benchmark data modeling (bachmodel.model_many and set_place) on synthetic raw season data
+'''
+
+import random
+import model
+
+def synthetic_seasons(seasons=40, contestants=30, seed=510):
+    # Raw data set 2 records shaped like the scrapers' output, generated deterministically
+    rng = random.Random(seed)
+    datas = []
+    for show in ['bachelor', 'bachelorette']:
+        for season in range(1, seasons+1):
+            for i in range(contestants):
+                if i == 0:
+                    eliminated = 'Winner'
+                elif i == 1:
+                    eliminated = rng.choice(['Runner-up', 'Runner-Up', 'runnerup'])
+                else:
+                    eliminated = f'''{rng.choice(['Week', 'Episode'])} {rng.randint(1, 10)}'''
+                datas.append({
+                    'name': f'Contestant {show} {season} {i}',
+                    'age': rng.choice([rng.randint(21, 38), float('nan'), str(rng.randint(21, 38))]),
+                    'hometown': rng.choice(['Dallas, Texas', 'Miami, Florida', float('nan')]),
+                    'occupation': rng.choice(['Nurse', 'Software Engineer', 'Dentist']),
+                    'eliminated': eliminated,
+                    'profile_url': f'https://bachelor-nation.fandom.com/wiki/Contestant_{show}_{season}_{i}',
+                    'season': season,
+                    'show': show
+                })
+    return datas
+
+def synthetic_shows(seasons=40):
+    # Raw data set 1 records shaped like the Wikipedia scraper's output
+    return [{
+        'Season': season,
+        'Original run': 'March 25, 2002 – April 25, 2002',
+        'Suitor': 'Alex Michel',
+        'Winner': 'Amanda Marsh',
+        'Runner(s)-Up': 'Trista Rehn',
+        'Proposal': 'Yes' if season % 2 else 'No',
+        'Show': show,
+        'Still together': 'No',
+        'Relationship notes': 'Notes'
+    } for show in ['bachelor', 'bachelorette'] for season in range(1, seasons+1)]
+
+def cases():
+    bachmodel = model.bachmodel('.')
+    ds1 = synthetic_shows()
+    ds2 = synthetic_seasons()
+    modeled2 = bachmodel.model_many(2, ds2)
+    return {
+        'modeling.model_many_ds1': lambda: bachmodel.model_many(1, ds1),
+        'modeling.model_many_ds2': lambda: bachmodel.model_many(2, ds2),
+        'modeling.set_place': lambda: bachmodel.set_place([dict(record) for record in modeled2])
+    }
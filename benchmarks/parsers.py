@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+
+'''
+Benchmark the scrapers' lxml page parsers against the reference BeautifulSoup parsers over saved
+HTML fixtures of each page style, verifying that both produce identical records
+
+    python -m benchmarks.parsers
+'''
+
+from scrapers import bachelornation
+from scrapers import wikipedia
+from . import reference
+import argparse
+import timeit
+import math
+import os
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Page style: (fixture, reference parser, lxml parser)
+PAGES = {
+    'season_gallery': ('season_gallery.html', lambda html: reference.parse_season(html, 'bachelor', 24), lambda html: bachelornation.parse_season(html, 'bachelor', 24)),
+    'season_table': ('season_table.html', lambda html: reference.parse_season(html, 'bachelor', 1), lambda html: bachelornation.parse_season(html, 'bachelor', 1)),
+    'contestant': ('contestant.html', lambda html: reference.parse_contestant(html, 'Cassie_Randolph'), lambda html: bachelornation.parse_contestant(html, 'Cassie_Randolph')),
+    'wikipedia': ('wikipedia.html', lambda html: reference.parse_wikipedia('bachelor', html), lambda html: wikipedia.parse('bachelor', html))
+}
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name), 'r') as f:
+        return f.read()
+
+def same(a, b):
+    # Compare parsed records, treating NaN (missing table cells) as equal to NaN
+    if isinstance(a, (list, tuple)):
+        return type(a) == type(b) and len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    if isinstance(a, dict):
+        return isinstance(b, dict) and a.keys() == b.keys() and all(same(a[key], b[key]) for key in a)
+    if isinstance(a, float) and isinstance(b, float) and math.isnan(a) and math.isnan(b):
+        return True
+    return a == b
+
+def run(repeat=20):
+    # Return the mean seconds per parse of each page style with each parser
+    results = {}
+    for page, (fixture, reference_parser, lxml_parser) in PAGES.items():
+        html = load_fixture(fixture)
+        if not same(reference_parser(html), lxml_parser(html)):
+            raise AssertionError(f'lxml parser records differ from the reference parser for {page}')
+        results[page] = {
+            'reference': timeit.timeit(lambda: reference_parser(html), number=repeat) / repeat,
+            'lxml': timeit.timeit(lambda: lxml_parser(html), number=repeat) / repeat
+        }
+    return results
+
+def cases():
+    # lxml parser for each page style, for the benchmark suite
+    htmls = {page: load_fixture(fixture) for page, (fixture, reference_parser, lxml_parser) in PAGES.items()}
+    return {f'parsers.{page}': (lambda page=page: PAGES[page][2](htmls[page])) for page in PAGES}
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the scrapers\' page parsers')
+    parser.add_argument('--repeat', dest='repeat', type=int, default=20, help='the number of times each fixture is parsed (i.e. 20)')
+    args = parser.parse_args()
+    print(f'''{'page':<16}{'reference (ms)':>16}{'lxml (ms)':>12}{'speedup':>10}''')
+    for page, seconds in run(args.repeat).items():
+        print(f'''{page:<16}{seconds['reference']*1000:>16.2f}{seconds['lxml']*1000:>12.2f}{seconds['reference']/seconds['lxml']:>9.1f}x''')
+
+if __name__ == '__main__':
+    main()
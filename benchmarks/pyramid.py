@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+'''
+Compare face preprocessing at reduced working resolutions against full resolution over the local
+face corpus: time per photo, faces found, and how far the resulting landmarks and algorithm scores
+move from the full resolution results
+
+    python -m benchmarks.pyramid --working-size 480 640 960
+'''
+
+from algorithms import batch
+from . import faces
+import numpy as np
+import argparse
+import time
+
+def preprocess(transform, keys, working_size):
+    # Records of every photo in the corpus (None where no face was found) and the mean seconds per photo
+    start = time.perf_counter()
+    records = [transform.process_face(i, 'Contestant', key, working_size)[1] for i, key in enumerate(keys)]
+    return [record if len(record) > 0 else None for record in records], (time.perf_counter() - start) / max(1, len(keys))
+
+def scores(record):
+    # Every algorithm's scores of one preprocessed face
+    landmarks = batch.stack_landmarks([record['dlib_landmarks']])
+    evaluated = batch.evaluate(landmarks, np.array([record['face_height']]), np.array([record['face_width']]), list(batch.ALGORITHMS.keys()))
+    return np.array([values[0] for key, values in sorted(evaluated.items())])
+
+def compare(full, reduced):
+    # Photos where both paths found a face, and the mean landmark (pixels on the 150px face) and score differences
+    both = [(a, b) for a, b in zip(full, reduced) if a and b]
+    if len(both) == 0:
+        return 0, float('nan'), float('nan')
+    landmark_error = np.mean([np.abs(np.array(a['dlib_landmarks']) - np.array(b['dlib_landmarks'])).mean() for a, b in both])
+    score_error = np.mean([np.abs(scores(a) - scores(b)).mean() for a, b in both])
+    return len(both), landmark_error, score_error
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare face preprocessing at reduced working resolutions with full resolution')
+    parser.add_argument('--working-size', dest='working_size', type=int, nargs='+', default=[480, 640, 960], help='the longest edge in pixels that photos are downsampled to (i.e. 640)')
+    args = parser.parse_args()
+    loaded = faces.load_corpus()
+    if not loaded:
+        return
+    transform, blobs, keys = loaded
+    full, full_seconds = preprocess(transform, keys, 0)
+    found = sum(1 for record in full if record)
+    print(f'''{'working size':<14}{'ms/photo':>10}{'speedup':>9}{'faces':>8}{'agree':>8}{'landmark err (px)':>19}{'score err':>11}''')
+    print(f'''{'full':<14}{full_seconds*1000:>10.1f}{1:>8.1f}x{found:>8}{found:>8}{0:>19.2f}{0:>11.4f}''')
+    for working_size in args.working_size:
+        reduced, seconds = preprocess(transform, keys, working_size)
+        agree, landmark_error, score_error = compare(full, reduced)
+        print(f'''{working_size:<14}{seconds*1000:>10.1f}{full_seconds/seconds:>8.1f}x{sum(1 for record in reduced if record):>8}{agree:>8}{landmark_error:>19.2f}{score_error:>11.4f}''')
+
+if __name__ == '__main__':
+    main()
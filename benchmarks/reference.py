@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+'''
+Reference (BeautifulSoup with html.parser) implementations of the scrapers' page parsers, kept to
+verify that the lxml parsers produce identical records and to measure their speedup
+'''
+
+from scrapers.wikipedia import remove_wikipedia_refs
+from bs4 import BeautifulSoup
+import pandas as pd
+import io
+import re
+
+def parse_wikipedia(show, html):
+    # Soup-ify the returned source
+    soup = BeautifulSoup(html, 'html.parser')
+    # Parse out Seasons table
+    table = soup.find('table', class_='wikitable plainrowheaders')
+    # Convert html table to dataframe
+    df = pd.read_html(io.StringIO(str(table)), header=0)[0]
+    # Rename '#' column to 'Season'
+    df = df.rename(columns={'#': 'Season'})
+    # Add 'Show' column
+    df['Show'] = [show for i in range(len(df.index))]
+    # Convert dataframe to dict
+    raw_data = [record for record in df.to_dict(orient='records')]
+    # Clean Wikipedia references from key-value pairs
+    data = remove_wikipedia_refs(raw_data)
+    return data
+
+def parse_season(html, show, season):
+    # Initialize list of contestants
+    contestants = []
+    # Soup-ify the returned source
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Check that there is contents on the page
+    alert_div = soup.find('div', class_='noarticletext mw-content-ltr')
+    if alert_div:
+        print(f'No contents on page for {season}. Skipping.')
+    else:
+        # Define list of known keys
+        keys = ['name', 'age', 'hometown', 'occupation', 'eliminated']
+        # Check for gallery style (common with newer season pages)
+        gallery_items = soup.findAll('div', class_='wikia-gallery-item')
+        if len(gallery_items) > 20:
+            # Iterate over gallery items and save info
+            for item in gallery_items:
+                caption = item.find('div', class_='lightbox-caption')
+                if caption:
+                    name = caption.find('a')
+                    if name:
+                        profile_url = f'''https://bachelor-nation.fandom.com{name['href']}'''
+                        values = re.split(r'<br\/{0,1}>', str(caption))
+                        if len(values) == 5:
+                            # Compile html tag removal regex pattern
+                            tag_pattern = re.compile(r'</{0,1}[a-z]{1,5}>')
+                            contestants.append({
+                                keys[0]: tag_pattern.sub('', name.text),
+                                keys[1]: int(tag_pattern.sub('', values[1].strip())),
+                                keys[2]: tag_pattern.sub('', values[2].strip()),
+                                keys[3]: tag_pattern.sub('', values[3].strip()),
+                                keys[4]: tag_pattern.sub('', values[4].strip()),
+                                'profile_url': tag_pattern.sub('', profile_url),
+                                'season': season,
+                                'show': show
+                            })
+            return contestants
+        # Else, check for table style (commone with older season pages)
+        else:
+            article_tables = soup.findAll('table', class_='article-table')
+            if len(article_tables) > 0:
+                # Iterate over tables and check headers
+                for table in article_tables:
+                    # Convert html table to dataframe
+                    df = pd.read_html(io.StringIO(str(table)), header=0)[0]
+                    # Check if column headers are expected
+                    if [col.strip().lower() for col in list(df.columns)] == keys:
+                        # We have confirmed we have the correct table of contestants
+                        # Normalized column names
+                        df = df.rename(columns={col: col.strip().lower() for col in df.columns})
+                        # Add profile_url column
+                        df['profile_url'] = [f'''https://bachelor-nation.fandom.com{a['href']}''' for a in table.findAll('a')]
+                        # Add season column
+                        df['season'] = [season for i in range(len(df.index))]
+                        # Add show column
+                        df['show'] = [show for i in range(len(df.index))]
+                        # Convert dataframe to dict
+                        contestants = [record for record in df.to_dict(orient='records')]
+                        return contestants
+    return contestants
+
+def parse_contestant(html, contestant):
+    # Initialize data dictionary and headshot url
+    data = {}
+    headshot_src = None
+    # Soup-ify the returned source
+    soup = BeautifulSoup(html, 'html.parser')
+
+    # Check that there is contents on the page
+    alert_div = soup.find('div', class_='noarticletext mw-content-ltr')
+    if alert_div:
+        print(f'No contents on page for {contestant}. Skipping.')
+    else:
+        # Parse out headshot
+        headshot = soup.find('img', class_='pi-image-thumbnail')
+        if headshot:
+            headshot_src = headshot['src']
+        # Parse out additional categorized info
+        infos = soup.findAll('div', class_='pi-item pi-data pi-item-spacing pi-border-color')
+        for pair in infos:
+            key = pair.find('h3').text.strip()
+            value = pair.find('div')
+            # If key is social_media, retrieve and save all social media links as list
+            if key.lower() == 'social media':
+                value = [a['href'] for a in value.findAll('a')]
+            # Otherwise, save the text
+            else:
+                value = value.text
+            data[key] = value
+        # Attempt to find height information included in wiki content
+        content = soup.find('div', id='content')
+        ps = content.findAll('p')
+        for p in ps:
+            b = p.find('b')
+            i = p.find('i')
+            if b and b.text.strip().lower() == 'height':
+                data['height'] = p.text.lower().replace(b.text.strip().lower(),'').strip()
+                if i:
+                    data['height'] = data['height'].replace(i.text.strip().lower(),'')
+    return data, headshot_src
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+
+'''
+Run the offline benchmark suite, compare the results against a stored JSON baseline, and flag
+regressions beyond a threshold (no network access or Instagram account needed)
+
+    python -m benchmarks.run                 # compare against the baseline
+    python -m benchmarks.run --save          # save the results as the new baseline
+    python -m benchmarks.run --suite parsers storage
+'''
+
+from . import modeling
+from . import parsers
+from . import storage
+from . import faces
+import statistics
+import argparse
+import datetime
+import platform
+import timeit
+import json
+import sys
+import os
+
+SUITES = {
+    'modeling': modeling,
+    'parsers': parsers,
+    'faces': faces,
+    'storage': storage
+}
+
+BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines', 'baseline.json')
+
+def measure(cases, repeat):
+    # Median wall time in seconds of each case
+    results = {}
+    for name, case in cases.items():
+        # Warm up (imports, caches, lazily loaded models) before timing
+        case()
+        results[name] = statistics.median(timeit.repeat(case, number=1, repeat=repeat))
+        print(f'  {name:<48}{results[name]*1000:>10.2f} ms')
+    return results
+
+def compare(results, baseline, threshold):
+    # Return the cases slower than their baseline by more than the threshold (a fraction)
+    regressions = {}
+    for name, seconds in results.items():
+        if name in baseline and seconds > baseline[name] * (1 + threshold):
+            regressions[name] = (baseline[name], seconds)
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the offline benchmark suite')
+    parser.add_argument('--suite', dest='suite', type=str, nargs='+', default=list(SUITES.keys()), help='a string benchmark suite to run (modeling, parsers, faces, and/or storage)')
+    parser.add_argument('--repeat', dest='repeat', type=int, default=5, help='the number of timed runs of each case (i.e. 5)')
+    parser.add_argument('--threshold', dest='threshold', type=float, default=0.2, help='the fraction slower than baseline that counts as a regression (i.e. 0.2)')
+    parser.add_argument('--baseline', dest='baseline', type=str, default=BASELINE, help='the path to the JSON baseline')
+    parser.add_argument('--save', dest='save', action='store_true', help='save the results as the new baseline')
+    args = parser.parse_args()
+
+    results = {}
+    for suite in args.suite:
+        print(f'🌹 Benchmarking {suite}')
+        results.update(measure(SUITES[suite].cases(), args.repeat))
+
+    if args.save:
+        # Merge into the existing baseline so that suites can be saved separately
+        baseline = {'results': {}}
+        if os.path.exists(args.baseline):
+            with open(args.baseline, 'r') as f:
+                baseline = json.load(f)
+        baseline['results'].update(results)
+        baseline['created'] = datetime.datetime.now().isoformat()
+        baseline['platform'] = platform.platform()
+        baseline['python'] = platform.python_version()
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+        print(f'🌹 Saved baseline to {args.baseline}')
+        return
+
+    if not os.path.exists(args.baseline):
+        print(f'  💔 No baseline at {args.baseline}; run with --save to create one')
+        return
+    with open(args.baseline, 'r') as f:
+        baseline = json.load(f)
+    regressions = compare(results, baseline['results'], args.threshold)
+    if len(regressions) > 0:
+        for name, (before, after) in regressions.items():
+            print(f'  💔 {name} regressed: {before*1000:.2f} ms -> {after*1000:.2f} ms ({(after/before-1)*100:+.0f}%)')
+        sys.exit(1)
+    print(f'🌹 No regressions beyond {args.threshold*100:.0f}% of the baseline')
+
+if __name__ == '__main__':
+    main()
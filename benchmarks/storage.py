@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+
+'''
+Benchmark saving and retrieving a data set 5-shaped dataframe with every storage backend
+'''
+
+import pandas as pd
+import numpy as np
+import tempfile
+import hashlib
+import model
+
+def synthetic_ds5(rows=2000, seed=510):
+    rng = np.random.default_rng(seed)
+    records = []
+    for i in range(rows):
+        record = {key: value for key, value in model.bachmodel('.').models[5].items()}
+        record['id'] = f'contestant-{i}'
+        record['name'] = f'Contestant {i}'
+        record['dlib_landmarks'] = rng.integers(0, 150, size=(68, 2)).tolist()
+        record['face_photo'] = hashlib.sha256(str(i).encode('utf-8')).hexdigest()
+        record['face_height'] = 150
+        record['face_width'] = int(rng.integers(90, 140))
+        records.append(record)
+    return pd.DataFrame(records)
+
+def cases():
+    tmpdir = tempfile.mkdtemp(prefix='bach-bench-')
+    df = synthetic_ds5()
+    results = {}
+    for backend in model.storage.BACKENDS:
+        bachmodel = model.bachmodel(tmpdir, backend=backend)
+        bachmodel.save_df(df, 5)
+        results[f'storage.{backend}.save_df'] = lambda bachmodel=bachmodel: bachmodel.save_df(df, 5)
+        results[f'storage.{backend}.retrieve_df'] = lambda bachmodel=bachmodel: bachmodel.retrieve_df(5)
+        results[f'storage.{backend}.retrieve_df_columns'] = lambda bachmodel=bachmodel: bachmodel.retrieve_df(5, columns=['id', 'face_height', 'face_width'])
+    # Landmarks are read from the memory-mapped tensor, independent of the storage backend
+    results['storage.landmarks'] = lambda: bachmodel.landmarks(df['id'], df['face_photo'])
+    return results
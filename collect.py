@@ -3,19 +3,19 @@
 '''
 * Data collection
 * Facilitate the conversion of raw data into the data model format (json)
-* Facilitate the storage of modeled data (pickled (serialized) pandas dataframes)
+* Facilitate the storage of modeled data (pandas dataframes in columnar files)
 '''
 
-from multiprocessing import Pool
 from scrapers import *
 import pandas as pd
-import argparse
 import datetime
-import random
+import telemetry
+import asyncio
 import model
+import bach
 import json
 import pytz
-import time
+import sys
 import os
 import re
 
@@ -30,13 +30,15 @@ Collect general information from all seasons of The Bachelor or The Bachelorette
 https://en.wikipedia.org/wiki/The_Bachelor_(American_TV_series)
 https://en.wikipedia.org/wiki/The_Bachelorette
 '''
-def scrape1():
+async def scrape1(fetcher):
     # Initialize data model handler object
     bachmodel = model.bachmodel(PATH_TO_VOLUME)
-    # Scrape
-    scraped = wikipedia.scrape('bachelor')
-    time.sleep(random.uniform(3,8))
-    scraped += wikipedia.scrape('bachelorette')
+    # Scrape (both requests are paced by the per-host rate limiter)
+    bachelor, bachelorette = await asyncio.gather(
+        wikipedia.scrape(fetcher, 'bachelor'),
+        wikipedia.scrape(fetcher, 'bachelorette')
+    )
+    scraped = bachelor + bachelorette
     # Model the raw data
     modeled_data = bachmodel.model_many(1, scraped)
     # Return modeled json data
@@ -48,16 +50,14 @@ Collect general information about all contestants from one given show's (The Bac
 https://bachelor-nation.fandom.com/wiki/The_Bachelor_(Season_1)
 https://bachelor-nation.fandom.com/wiki/The_Bachelorette_(Season_1)
 '''
-def scrape2(show, season):
+async def scrape2(fetcher, show, season):
     # Initialize data model handler object
     bachmodel = model.bachmodel(PATH_TO_VOLUME)
-    # Assume asyncronous scraping
-    time.sleep(random.uniform(3,8))
     # Scrape
     if show == 0:
-        scraped = bachelornation.scrape_season('bachelor', season)
+        scraped = await bachelornation.scrape_season(fetcher, 'bachelor', season)
     elif show == 1:
-        scraped = bachelornation.scrape_season('bachelorette', season)
+        scraped = await bachelornation.scrape_season(fetcher, 'bachelorette', season)
     # Continue if response is not empty
     if len(scraped) > 0:
         # Model the raw data
@@ -70,19 +70,20 @@ Scrape data Set 3
 Collect photos and additional physical information of one Bachelor/Bachelorette cast member
 https://bachelor-nation.fandom.com/wiki/Alex_Michel
 '''
-def scrape3(id, contestant):
+async def scrape3(fetcher, id, contestant):
     # Initialize data model handler object
     bachmodel = model.bachmodel(PATH_TO_VOLUME)
-    # Assume asyncronous scraping
-    time.sleep(random.uniform(3,8))
     # Scrape
-    scraped = bachelornation.scrape_contestant(contestant)
+    scraped = await bachelornation.scrape_contestant(fetcher, contestant)
     # Continue if response is not empty
     if len(scraped) > 0:
         # Add id to raw record
         scraped['id'] = id
         # Add profile_url to record
         scraped['profile_url'] = contestant
+        # Store headshot in the blob store and keep only its key
+        if 'photo' in scraped:
+            scraped['photo'] = bachmodel.blobs.put(scraped['photo']) if scraped['photo'] else ''
         # Model the raw data
         modeled_data = bachmodel.model_one(3, scraped)
         # Return modeled json data
@@ -93,59 +94,126 @@ Compile data Set 4
 Collect social media data and photos of one Bachelor/Bachelorette cast member
 https://www.instagram.com (Undocumented Instagram API)
 '''
-def compile4(ig_api, id, contestant_ig_url):
+async def compile4(ig_api, id, contestant_ig_url):
     # Initialize data model handler object
     bachmodel = model.bachmodel(PATH_TO_VOLUME)
-    # Assume asyncronous scraping
-    time.sleep(random.uniform(3,8))
     # Extract instagram username from url
     username_match = re.search(r'(?<=instagram\.com/)[a-zA-Z0-9._]{1,30}', contestant_ig_url)
     if username_match:
         contestant_ig_username = username_match.group(0)
         # GET
-        returned = ig_api.get_profile(contestant_ig_username)
+        returned = await ig_api.get_profile(contestant_ig_username)
         # Continue if response is not empty
         if len(returned) > 0:
             # Add id to raw record
             returned['id'] = id
             # Add url to record
             returned['url'] = contestant_ig_url
+            # Store photos in the blob store and keep only their keys
+            for key in bachmodel.blob_columns[4]:
+                if key in returned:
+                    returned[key] = bachmodel.blobs.put(returned[key]) if returned[key] else ''
             # Model the raw data
             modeled_data = bachmodel.model_one(4, returned)
             # Return modeled json data
             return modeled_data
 
+'''
+Run many scraping coroutines concurrently on the fetch engine, journaling each work item's
+records as soon as it finishes (work items already in the journal are skipped when resuming)
+'''
+def run_all(coro, items, ds_journal, resume):
+    stage = f'ds{ds_journal.ds}'
+    if resume:
+        done = ds_journal.keys()
+        print(f'  ⏩ Resuming: {len(done)} work items already collected')
+    else:
+        ds_journal.reset()
+        done = set()
+    failed = []
+    async def run(key, args):
+        try:
+            with telemetry.timer(stage):
+                result = await coro(*args)
+        except Exception as e:
+            # Report failed items (they are retried on resume) rather than abandoning the whole data set
+            print(f'  💔 {e}')
+            telemetry.count('items_failed', stage=stage)
+            failed.append(key)
+            return
+        if isinstance(result, list):
+            records = result
+        else:
+            records = [result] if result else []
+        ds_journal.append(key, records)
+    async def gather():
+        await asyncio.gather(*[run(key, args) for key, args in items if key not in done])
+    asyncio.run(gather())
+    ds_journal.close()
+    return failed
+
+'''
+Compact a data set's journal into its data set file
+'''
+def compact(bachmodel, ds_journal, ds, failed):
+    df = ds_journal.dataframe()
+    # Only discard the journal once the data set is safely saved and no work items remain to be retried
+    if bachmodel.save_df(df, ds):
+        if ds_journal.skipped > 0:
+            print(f'  💔 {ds_journal.skipped} journal entries could not be read; the journal is kept')
+        elif len(failed) == 0:
+            ds_journal.remove()
+        else:
+            print(f'  💔 {len(failed)} work items failed; rerun with --resume to retry them')
+    return df
+
+'''
+Whether a data set was finished by an earlier run (its file is stored and its journal was compacted and removed)
+'''
+def collected(bachmodel, ds):
+    return os.path.exists(bachmodel.df_path(ds)) and not os.path.exists(model.journal(PATH_TO_VOLUME, ds).path)
+
 '''
 Main
 '''
-def main():
-    # Retrieve args
-    parser = argparse.ArgumentParser(description='Process some integers.')
-    parser.add_argument('--dataset', dest='dataset', type=int, nargs='+', default=[1, 2, 3, 4], help='an integer associated with a data set (i.e. 4)')
-    parser.add_argument('--season', dest='season', type=int, nargs='+', default=[], help='an integer season (only applicable with data source 2) (i.e. 11)')
-    parser.add_argument('--contestant', dest='contestant', type=str, nargs='+', default=[], help='a string contestant first and last name separated by "_" (only applicable with data sources 3 and 4) (i.e. joelle_fletcher)')
-    args = parser.parse_args()
+def main(args=None):
+    # Retrieve args (see bach.py)
+    if args is None:
+        args = bach.parse_args(['collect', *sys.argv[1:]])
 
-    # Initialize multiprocessing pool with 5 threads
-    pool = Pool(processes=5)
+    # Report per-stage metrics to the volume while collecting
+    metrics = telemetry.reporter(PATH_TO_VOLUME).start()
+
+    # Initialize the fetch engine shared by all scrapers (responses are cached in the volume)
+    fetcher = fetch.engine(rate=args.rate, concurrency=args.concurrency, cachedir=os.path.join(PATH_TO_VOLUME, 'http_cache'), offline=args.offline, max_edge=args.max_edge, jpeg_quality=args.jpeg_quality, retries=args.retries)
 
     # Initialize data model handler object
     bachmodel = model.bachmodel(PATH_TO_VOLUME)
 
+    # When resuming, skip data sets an interrupted run already finished (collecting data set 2 again would give its
+    # contestants new ids, which no longer match the keys journaled for data set 3)
+    datasets = list(args.dataset)
+    if args.resume:
+        for ds in args.dataset:
+            if collected(bachmodel, ds):
+                print(f'  ⏩ Resuming: data set {ds} was already collected')
+                datasets.remove(ds)
+
     # Initialize dataframe variables
     df1 = None
     df2 = None
     df3 = None
     # Data set 1
-    if 1 in args.dataset:
+    if 1 in datasets:
         print('🌹 Collecting data set 1')
         # Scrape data set 1
-        ds1_data = scrape1()
+        with telemetry.timer('ds1'):
+            ds1_data = asyncio.run(scrape1(fetcher))
         df1 = pd.DataFrame(list(ds1_data))
         # Save data set 1
         bachmodel.save_df(df1, 1)
     # Data set 2
-    if 2 in args.dataset:
+    if 2 in datasets:
         print('🌹 Collecting data set 2')
         seasons = []
         # If season argument is specified, collect only the given seasons
@@ -154,9 +222,9 @@ def main():
                 seasons += [(show, season) for season in args.season]
         # Otherwise, collect all seasons available from data set 1
         else:
-            # If data set 1 hasn't been read-in to a dataframe, attempt to read data set 1 from pickled file
+            # If data set 1 hasn't been read-in to a dataframe, attempt to read data set 1 from storage
             if not isinstance(df1, pd.DataFrame):
-                df1 = bachmodel.retrieve_df(1)
+                df1 = bachmodel.retrieve_df(1, columns=['show', 'season'])
             if not df1.empty:
                 for show in [0,1]:
                     try:
@@ -168,22 +236,18 @@ def main():
                         seasons += [(show, season) for season in range(1, max_season+1)]
                     else:
                         print('  💔 Unable to collect data set 2. Has data set 1 been collected and stored?')
-        # Multiprocess
-        ds2_resp = pool.starmap_async(scrape2, seasons)
-        ds2_data = []
-        for recs in ds2_resp.get():
-            if recs:
-                ds2_data += recs
-        df2 = pd.DataFrame(ds2_data)
+        # Scrape concurrently
+        ds2_journal = model.journal(PATH_TO_VOLUME, 2)
+        ds2_failed = run_all(scrape2, [(f'{show}_{season}', (fetcher, show, season)) for show, season in seasons], ds2_journal, args.resume)
         # Save data set 2
-        bachmodel.save_df(df2, 2)
+        df2 = compact(bachmodel, ds2_journal, 2, ds2_failed)
     # Data set 3
-    if 3 in args.dataset:
+    if 3 in datasets:
         print('🌹 Collecting data set 3')
         contestants = []
-        # If data set 2 hasn't been read-in to a dataframe, attempt to read data set 2 from pickled file
+        # If data set 2 hasn't been read-in to a dataframe, attempt to read data set 2 from storage
         if not isinstance(df2, pd.DataFrame):
-            df2 = bachmodel.retrieve_df(2)
+            df2 = bachmodel.retrieve_df(2, columns=['id', 'name', 'profile_url'])
         if not df2.empty:
             # If contestant argument is specified, collect only the given contestants
             if len(args.contestant) > 0:
@@ -197,20 +261,20 @@ def main():
                 contestants = df2[['id','profile_url']].values.tolist()
                 if len(contestants) == 0:
                     print(f'  💔 Unable to collect data set 3. Has data set 2 been collected and stored?')
-        # Multiprocess
-        ds3_resp = pool.starmap_async(scrape3, contestants)
-        df3 = pd.DataFrame([rec for rec in list(ds3_resp.get()) if rec != None])
+        # Scrape concurrently
+        ds3_journal = model.journal(PATH_TO_VOLUME, 3)
+        ds3_failed = run_all(scrape3, [(id, (fetcher, id, profile_url)) for id, profile_url in contestants], ds3_journal, args.resume)
         # Save data set 3
-        bachmodel.save_df(df3, 3)
+        df3 = compact(bachmodel, ds3_journal, 3, ds3_failed)
     # Data set 4
-    if 4 in args.dataset:
+    if 4 in datasets:
         print('🌹 Collecting data set 4')
         contestants_igs = []
         # Initialize instagram api object
-        ig = instagram.api(os.path.join(PATH_TO_VOLUME, 'ig.cfg'))
-        # If data set 3 hasn't been read-in to a dataframe, attempt to read data set 3 from pickled file
+        ig = instagram.api(os.path.join(PATH_TO_VOLUME, 'ig.cfg'), fetcher)
+        # If data set 3 hasn't been read-in to a dataframe, attempt to read data set 3 from storage
         if not isinstance(df3, pd.DataFrame):
-            df3 = bachmodel.retrieve_df(3)
+            df3 = bachmodel.retrieve_df(3, columns=['id', 'name', 'social_media'])
         if not df3.empty:
             # If contestant argument is specified, collect only the given contestants
             if len(args.contestant) > 0:
@@ -232,11 +296,14 @@ def main():
                             contestants_igs.append((ig, contestant[0], url))
                 if len(contestants_igs) == 0:
                     print(f'  💔 Unable to collect data set 4. Has data set 3 been collected and stored?')
-        # Multiprocess
-        ds4_resp = pool.starmap_async(compile4, contestants_igs)
-        df4 = pd.DataFrame([rec for rec in list(ds4_resp.get()) if rec != None])
+        # Scrape concurrently
+        ds4_journal = model.journal(PATH_TO_VOLUME, 4)
+        ds4_failed = run_all(compile4, [(f'{id}_{url}', (ig, id, url)) for ig, id, url in contestants_igs], ds4_journal, args.resume)
         # Save data set 4
-        bachmodel.save_df(df4, 4)
+        compact(bachmodel, ds4_journal, 4, ds4_failed)
+
+    fetcher.close()
+    metrics.stop()
 
 
 if __name__ == '__main__':
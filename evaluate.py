@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+
+'''
+Evaluate data set 5 with the attractiveness algorithms
+	- Rule of thirds
+	- Rule of fifths
+	- Golden ratio
+
+Evaluation only needs each contestant's landmarks and face dimensions, so unlike preprocessing
+(see transform.py) it doesn't import OpenCV or dlib
+'''
+
+from algorithms import batch
+import pandas as pd
+import numpy as np
+import telemetry
+import model
+import time
+import bach
+import sys
+import os
+
+# Global var for path to volume within container
+PATH_TO_VOLUME = os.path.join(os.getcwd(), 'data')
+if not os.path.exists(PATH_TO_VOLUME):
+	os.mkdir(PATH_TO_VOLUME)
+
+'''
+Evaluate contestants' faces with every selected algorithm in a single pass
+'''
+def evaluate_faces(df5, algorithms, landmarks=None, cache=None, valid=None):
+	# Take the contestants' (N, 68, 2) landmark tensor in row order (i.e. bachmodel.landmarks(df5['id'])), or stack
+	# the dlib_landmarks column if it isn't given; face dimensions come from the stored columns
+	# Only faces with landmarks are evaluated (the valid mask of the given tensor, or non-empty dlib_landmarks), so
+	# results have no rows for the others
+	# Results are cached by a hash of each face's landmarks and dimensions along with the algorithm's version
+	if landmarks is None:
+		valid = np.array([len(points) > 0 for points in df5['dlib_landmarks']], dtype=bool)
+		landmarks = batch.stack_landmarks([points for points, ok in zip(df5['dlib_landmarks'], valid) if ok])
+	else:
+		valid = np.ones(len(df5), dtype=bool) if valid is None else np.asarray(valid, dtype=bool)
+		landmarks = np.asarray(landmarks)[valid]
+	df5 = df5[valid]
+	# Widen the stored int16 landmarks so that distances and products can't overflow
+	landmarks = np.asarray(landmarks).astype(np.int64)
+	heights = df5['face_height'].to_numpy()
+	widths = df5['face_width'].to_numpy()
+	# Evaluate each algorithm over all contestants at once, timing each one
+	results = pd.DataFrame({'id': df5['id'].to_numpy()})
+	timings = {}
+	faces = [model.digest(landmarks[i].tobytes(), int(heights[i]), int(widths[i])) for i in range(len(landmarks))] if cache is not None else []
+	for algorithm in algorithms:
+		start = time.perf_counter()
+		if cache is None:
+			for key, values in batch.evaluate(landmarks, heights, widths, [algorithm]).items():
+				results[key] = values
+		else:
+			# Only evaluate faces whose results aren't cached for this version of the algorithm
+			keys = [f'{algorithm}:{batch.ALGORITHMS[algorithm].VERSION}:{face}' for face in faces]
+			cached = cache.get_many('evaluate', keys)
+			misses = np.array([key not in cached for key in keys], dtype=bool)
+			if misses.any():
+				evaluated = {column: values.tolist() for column, values in batch.evaluate(landmarks[misses], heights[misses], widths[misses], [algorithm]).items()}
+				new = {key: {column: values[row] for column, values in evaluated.items()} for row, key in enumerate(np.array(keys)[misses])}
+				cache.put_many('evaluate', new.items())
+				cached.update(new)
+			for column in (cached[keys[0]] if len(keys) > 0 else {}):
+				results[column] = np.array([cached[key][column] for key in keys], dtype=np.float64)
+		timings[algorithm] = time.perf_counter() - start
+		telemetry.observe(f'algorithm:{algorithm}', timings[algorithm], len(landmarks))
+	return results, timings
+
+def merge_results(df5, results):
+	# Overwrite the evaluated columns of data set 5 with one lookup keyed on contestant id (rows without results keep
+	# their values; duplicate ids in data set 5 all get their id's results, and the last result of a duplicate id wins)
+	merged = df5.copy()
+	results = results.drop_duplicates('id', keep='last').set_index('id')
+	for key in results.columns:
+		values = merged['id'].map(results[key])
+		merged[key] = values.where(values.notna(), merged[key] if key in merged.columns else 0.0)
+	return merged
+
+'''
+Evaluate the given contestants (all by default) in data set 5 and save the results to data set 5
+'''
+def evaluate_all(bachmodel, algorithms, contestants=[], cache=None, df5=None):
+	# If data set 5 hasn't been read-in to a dataframe, attempt to read data set 5 from storage
+	# (without its landmarks, which are read from the memory-mapped landmark tensor instead)
+	stored = not isinstance(df5, pd.DataFrame)
+	if stored:
+		df5 = bachmodel.retrieve_df(5, landmarks=False)
+	if df5.empty:
+		print(f'  💔 Unable to evaluate data set 5. Has data set 5 been collected, preprocessed, and stored?')
+		return df5
+	# If no contestants are given by the user, evaluate all pre-processed contestants
+	if len(contestants) == 0:
+		selected = df5
+	else:
+		names = []
+		for contestant in contestants:
+			names_split = contestant.lower().split('_')
+			names.append(f'''{names_split[0][0].upper()}{names_split[0][1:].lower()} {names_split[1][0].upper()}{names_split[1][1:].lower()}''')
+		selected = df5.loc[df5['name'].isin(names)]
+	if len(selected.index) == 0:
+		print(f'  💔 Unable to evaluate data set 5. Has data set 5 been collected, preprocessed, and stored?')
+		return df5
+	print(f'''🌹 Evaluating {', '.join(algorithms)} for {len(selected.index)} contestants''')
+	# Evaluate all selected algorithms in one pass and merge the results into data set 5
+	landmarks, valid = None, None
+	if stored:
+		try:
+			landmarks, valid = bachmodel.landmarks(selected['id'], selected['face_photo'], valid=True)
+		except (OSError, ValueError) as e:
+			print(f'  💔 Unable to evaluate data set 5: {e}')
+			return df5
+		if not valid.all():
+			print(f'  💔 Skipping {np.count_nonzero(~valid)} contestants whose faces have no landmarks')
+	results, timings = evaluate_faces(selected, algorithms, landmarks, cache, valid)
+	for algorithm, seconds in timings.items():
+		print(f'  ⏱️  {algorithm}: {seconds:.4f}s')
+	df5 = merge_results(df5, results)
+	# Save data set 5
+	bachmodel.save_df(df5, 5)
+	return df5
+
+def main(args=None):
+	# Retrieve args (see bach.py)
+	if args is None:
+		args = bach.parse_args(['evaluate', *sys.argv[1:]])
+
+	# Report per-stage metrics to the volume while evaluating
+	metrics = telemetry.reporter(PATH_TO_VOLUME).start()
+
+	# Initialize data model handler object and the cache of algorithm results
+	bachmodel = model.bachmodel(PATH_TO_VOLUME)
+	cache = None if args.no_cache else model.result_cache(os.path.join(PATH_TO_VOLUME, 'results.sqlite3'))
+
+	algorithms = [algorithm for algorithm in batch.ALGORITHMS if algorithm in args.algorithm]
+	evaluate_all(bachmodel, algorithms, args.contestant, cache)
+
+	# Report how much work the cache saved
+	if cache is not None:
+		cache.report()
+		cache.close()
+	metrics.stop()
+
+if __name__ == '__main__':
+	main()
@@ -1,18 +1,30 @@
 #!/usr/bin/env python
 
 '''
-* Convert raw input json data into modeled json data
+* Convert raw input json data into modeled json data (with compiled per-data set schemas)
+* Save and retrieve modeled data sets with a pluggable storage backend
+* Store images in a content-addressed blob store
+* Store data set 5's landmarks in a memory-mapped tensor
+* Journal records of data sets as they are collected
+* Share preprocessing and evaluation tasks between workers with a SQLite work queue
+* Cache transformation results by a hash of their inputs
 '''
 
+from .blobs import blobstore
+from .landmarks import landmark_store
+from .journal import journal
+from .workqueue import workqueue, keepalive, worker_name
+from .results import result_cache, digest
+from . import storage
+from . import schema
+import telemetry
 import pandas as pd
+import numpy as np
 import json
-import math
-import uuid
-import re
 import os
 
 class bachmodel():
-    def __init__(self, localdir):
+    def __init__(self, localdir, backend='parquet'):
         # Data model references for all data sets
         self.models = {
             1: {
@@ -42,6 +54,8 @@ class bachmodel():
                 'id': '',
                 'name': '',
                 'photo': '',
+                'photo_width': -1, # original dimensions of the downloaded photo
+                'photo_height': -1,
                 'profile_url': '',
                 'born': '',
                 'hometown': '',
@@ -57,22 +71,30 @@ class bachmodel():
                 'is_private': -1, # 0 for false, 1 for true
                 'name': '',
                 'photo1': '',
+                'photo1_width': -1, # original dimensions of the downloaded photo
+                'photo1_height': -1,
                 'photo1_comments': -1,
                 'photo1_likes': -1,
                 'photo1_comments_disabled': -1, # 0 for false, 1 for true
                 'photo1_timestamp': '',
                 'photo2': '',
+                'photo2_width': -1, # original dimensions of the downloaded photo
+                'photo2_height': -1,
                 'photo2_comments': -1,
                 'photo2_likes': -1,
                 'photo2_comments_disabled': -1, # 0 for false, 1 for true
                 'photo2_timestamp': '',
                 'photo3': '',
+                'photo3_width': -1, # original dimensions of the downloaded photo
+                'photo3_height': -1,
                 'photo3_comments': -1,
                 'photo3_likes': -1,
                 'photo3_comments_disabled': -1, # 0 for false, 1 for true
                 'photo3_timestamp': '',
                 'post_count': -1,
                 'prof_photo': '',
+                'prof_photo_width': -1, # original dimensions of the downloaded photo
+                'prof_photo_height': -1,
                 'url': '',
                 'user_id': '',
                 'username': ''
@@ -111,163 +133,147 @@ class bachmodel():
                 'h7_ratio': 0.0
             }
         }
+        # Data models compiled into per-field converters
+        self.schemas = {ds: schema.schema(model) for ds, model in self.models.items()}
         # Global var for path to volume within container
         self.localdir = localdir
+        # Storage backend for data sets (pickle, parquet, or feather)
+        self.storage = storage.BACKENDS[backend]()
+        # Content-addressed image storage; these columns hold blob keys
+        self.blobs = blobstore(localdir)
+        self.blob_columns = {
+            3: ['photo'],
+            4: ['prof_photo', 'photo1', 'photo2', 'photo3'],
+            5: ['face_photo']
+        }
+        # Data set 5's landmarks are stored as an (N, 68, 2) tensor instead of a dataframe column
+        self.landmark_store = landmark_store(localdir)
+
+    def df_path(self, ds, backend=None):
+        backend = backend if backend else self.storage
+        return os.path.join(self.localdir, f'ds{ds}.{backend.extension}')
 
     def save_df(self, df, ds):
         try:
-            df.to_pickle(os.path.join(self.localdir, f'ds{ds}.pkl'))
+            with telemetry.timer(f'save_ds{ds}', len(df)):
+                self.store(df, ds)
             return True
         except Exception as e:
             print(f'  💔 {e}')
             return False
 
-    def retrieve_df(self, ds):
+    def store(self, df, ds):
+        # Move data set 5's landmarks into the landmark tensor (dataframes without them keep the stored tensor)
+        if ds == 5 and 'dlib_landmarks' in df.columns:
+            self.landmark_store.save(df['id'], df['face_photo'], df['dlib_landmarks'])
+            df = df.drop(columns=['dlib_landmarks'])
+        self.storage.save(df, self.df_path(ds))
+
+    def retrieve_df(self, ds, columns=None, landmarks=True):
+        # Data set 5's dlib_landmarks column is rebuilt from the landmark tensor if it's requested
+        # (use landmarks() or landmarks=False to skip converting the tensor to lists)
         try:
-            df = pd.read_pickle(os.path.join(self.localdir, f'ds{ds}.pkl'))
+            # Migrate data sets stored by the legacy pickle backend on first read
+            if not os.path.exists(self.df_path(ds)) and os.path.exists(self.df_path(ds, storage.pickle_backend)):
+                self.migrate(ds)
+            # Migrate data set 5's landmarks column into the landmark tensor on first read
+            if ds == 5 and os.path.exists(self.df_path(ds)) and not self.landmark_store.exists():
+                self.migrate_landmarks()
+            attach = ds == 5 and landmarks and (columns is None or 'dlib_landmarks' in columns)
+            load_columns = columns
+            if ds == 5 and columns is not None:
+                load_columns = [column for column in columns if column != 'dlib_landmarks']
+                if attach:
+                    load_columns += [column for column in ['id', 'face_photo'] if column not in load_columns]
+            with telemetry.timer(f'load_ds{ds}'):
+                df = self.storage.load(self.df_path(ds), columns=load_columns)
+                if attach:
+                    # Rows without landmarks, or whose stored landmarks were saved for a different face, get none
+                    table, rows = self.landmark_store.match(df['id'], df['face_photo'])
+                    mismatched = np.count_nonzero(rows < 0)
+                    if mismatched > 0:
+                        print(f'  💔 {mismatched} contestants are missing from {os.path.basename(self.landmark_store.path)} or do not match data set 5; rerun transform.py to rebuild it')
+                    df.insert(min(2, len(df.columns)), 'dlib_landmarks', [table['points'][row].tolist() if row >= 0 and table['valid'][row] else [] for row in rows])
+                    if columns is not None:
+                        df = df[columns]
             return df
         except Exception as e:
             print(f'  💔 {e}')
             # Return an empty dataframe
             return pd.DataFrame({'A' : []})
 
+    # Convert a data set pickled by the legacy backend to the configured backend
+    def migrate(self, ds):
+        legacy = storage.pickle_backend()
+        if isinstance(self.storage, storage.pickle_backend):
+            return False
+        print(f'  📦 Migrating ds{ds}.{legacy.extension} to ds{ds}.{self.storage.extension}')
+        df = legacy.load(self.df_path(ds, legacy))
+        # Move base64 encoded images into the blob store
+        for column in self.blob_columns.get(ds, []):
+            if column in df.columns:
+                df[column] = [self.blobs.put_uri(value) if type(value) == str and value.startswith('data:') else value for value in df[column]]
+        self.store(df, ds)
+        return True
+
+    # Move the landmarks column of a data set 5 saved before the landmark tensor existed (or the landmark tensor
+    # and separate id index saved by an earlier version) into the landmark tensor
+    def migrate_landmarks(self):
+        df = self.storage.load(self.df_path(5))
+        if 'dlib_landmarks' not in df.columns and self.landmark_store.legacy():
+            landmarks = self.landmark_store.load_legacy()
+            df['dlib_landmarks'] = [landmarks[str(id)].tolist() if str(id) in landmarks and landmarks[str(id)].any() else [] for id in df['id']]
+        if 'dlib_landmarks' in df.columns:
+            print(f'  📦 Migrating ds5 landmarks to {os.path.basename(self.landmark_store.path)}')
+            self.store(df, 5)
+            return True
+        return False
+
+    # Return the (N, 68, 2) int16 landmarks of the given data set 5 contestants (every contestant by default)
+    # from the memory-mapped landmark tensor, as zero-copy views where possible
+    # With the contestants' face_photo blob keys, the landmarks are checked to be from the same save as data set 5
+    # (a ValueError is raised if they aren't); with valid, a mask of the faces that had landmarks is also returned
+    # (the landmarks of the other faces are all zero)
+    def landmarks(self, ids=None, faces=None, valid=False):
+        if ids is None:
+            table = self.landmark_store.load()[0]
+            landmarks, mask = table['points'], np.asarray(table['valid'])
+        else:
+            landmarks, mask = self.landmark_store.rows(ids, faces)
+        return (landmarks, mask) if valid else landmarks
+
+    # Return data set 5's id -> landmark tensor row index
+    def landmark_index(self):
+        return self.landmark_store.load()[1]
+
     # Evaluate and set the place of each contestant in a season
     def set_place(self, data):
-        # Split data into shows/seasons
-        seasons_data = {}
-        for item in data:
-            key = f'''{item['show']}{item['season']}'''
-            if key not in seasons_data:
-                seasons_data[key] = [item]
-            else:
-                seasons_data[key].append(item)
-        # Iterate over seasons, evaluate places, and compile a list
+        if len(data) == 0:
+            return []
+        place, order = schema.places([item['show'] for item in data], [item['season'] for item in data], [item['eliminated'] for item in data])
+        # Return contestants grouped by season, with their places set
         places = []
-        for show_season, season_data in seasons_data.items():
-            # Get the elimination weeks
-            eliminated = [row['eliminated'] for row in season_data if row['eliminated'] not in ['winner', 'runnerup']]
-            # Order the list in reverse order
-            eliminated = sorted(eliminated, reverse=True)
-            # Insert winner and runner-up at indices 0 and 1 respectively
-            eliminated.insert(0, 'winner')
-            eliminated.insert(1, 'runnerup')
-            # Update season_data
-            for contestant in season_data:
-                try:
-                    # Place of contestant is the index of the contestant's elimination week in "eliminated" + 1
-                    place = eliminated.index(contestant['eliminated'])+1
-                    contestant['place'] = int(place)
-                except ValueError:
-                    contestant['place'] = -1
-                places.append(contestant)
+        for index in order:
+            data[index]['place'] = int(place[index])
+            places.append(data[index])
         return places
 
     # Model provided json (dict) data
     def model_one(self, ds, data):
-        elimination_week_pattern = re.compile(r'winner|runner-{0,1}up|week [1-9][0-9]{0,1}|episode [1-9][0-9]{0,1}')
-        modeled_data = {}
         # Ensure the data is json
-        if type(data) == dict:
-            # Normalize keys in data
-            data = {key.replace('(','').replace(')','').replace(':','').replace('-','').replace(' ','_').lower():value for key, value in data.items()}
-            for key, value in self.models[ds].items():
-                if key in data:
-                    # Handle data specific data manipulations
-                    if key == 'show':
-                        if type(data[key]) == str:
-                            if 'bachelorette' in data[key].lower():
-                                modeled_data[key] = 1
-                            elif 'bachelor' in data[key].lower():
-                                modeled_data[key] = 0
-                            else:
-                                print(f'Value {data[key]} was not able to be evaluated as The Bachelor or The Bachelorette')
-                                modeled_data[key] = -1
-                        else:
-                            if math.isnan(data[key]):
-                                modeled_data[key] = -1
-                            else:
-                                print(f'Value {data[key]} was not able to be evaluated as The Bachelor or The Bachelorette')
-                                modeled_data[key] = -1
-                    elif key == 'proposal' or key == 'still_together':
-                        if type(data[key]) == str:
-                            if 'yes' in data[key].lower():
-                                modeled_data[key] = 1
-                            elif 'no' in data[key].lower():
-                                modeled_data[key] = 0
-                            else:
-                                print(f'Value {data[key]} was not able to be evaluated as yes or no')
-                                modeled_data[key] = -1
-                        else:
-                            if math.isnan(data[key]):
-                                modeled_data[key] = -1
-                            else:
-                                print(f'Value {data[key]} was not able to be evaluated as yes or no')
-                                modeled_data[key] = -1
-                    elif key == 'eliminated':
-                         if type(data[key]) == float and math.isnan(data[key]):
-                             modeled_data[key] = ''
-                         else:
-                            try:
-                                elimination_str = elimination_week_pattern.findall(data[key].lower())
-                                if len(elimination_str) > 0:
-                                    # Save last instance of regex pattern match
-                                    modeled_data[key] = elimination_str[-1].replace('episode','week').replace('-','')
-                                else:
-                                    modeled_data[key] = ''
-                            except ValueError:
-                                modeled_data[key] = ''
-                                print(f'Value {data[key]} was not able to be cast to string')
-                    elif key in ['is_private', 'photo1_comments_disabled', 'photo2_comments_disabled', 'photo3_comments_disabled']:
-                        if data[key] != None:
-                            if data[key]:
-                                modeled_data[key] = 1
-                            elif not data[key]:
-                                modeled_data[key] = 0
-                            else:
-                                modeled_data[key] = -1
-                        else:
-                            modeled_data[key] = -1
-                    else:
-                        if type(data[key]) == float and math.isnan(data[key]):
-                            if type(value) == int:
-                                modeled_data[key] = -1
-                            elif type(value) == str:
-                                modeled_data[key] = ''
-                        else:
-                            try:
-                                modeled_data[key] = type(value)(data[key])
-                            except ValueError:
-                                if type(value) == int:
-                                    modeled_data[key] = -1
-                                    print(f'Value {data[key]} was not able to be cast to integer')
-                                elif type(value) == str:
-                                    modeled_data[key] = ''
-                                    print(f'Value {data[key]} was not able to be cast to string')
-                else:
-                    # If id has not yet been set, set it now (this should only be applicable when modeling data set 2)
-                    if key == 'id':
-                        modeled_data[key] = str(uuid.uuid4())
-                    else:
-                        modeled_data[key] = value
-        else:
+        if type(data) != dict:
             print('  💔 Only a json object is permitted')
             return {}
+        modeled_datas = self.schemas[ds].apply([data])
         # If the resulting json object (dict) only contains null values, return an empty dict
-        if modeled_data == self.models[ds]:
-            modeled_data = {}
-        return modeled_data
+        return modeled_datas[0] if len(modeled_datas) > 0 else {}
 
     # Model provided list of json (dict) objects data
     def model_many(self, ds, datas):
         # Ensure the data is json
         if type(datas) == list and len(datas) > 0 and type(datas[0]) == dict:
-            # Model the data
-            modeled_datas = []
-            for data in datas:
-                modeled_data = self.model_one(ds, data)
-                # Only save objects that are not empty
-                if modeled_data != {}:
-                    modeled_datas.append(modeled_data)
+            # Model the data (one field at a time, only keeping objects that are not empty)
+            modeled_datas = self.schemas[ds].apply(datas)
             # Set places of contestants in data set 2
             if ds == 2:
                 modeled_datas = self.set_place(modeled_datas)
@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+'''
+* Content-addressed storage for images
+* Each image is stored once under blobs/ keyed by the SHA-256 hash of its bytes, so data sets
+  only hold the 64 character hash and identical images are deduplicated
+'''
+
+import tempfile
+import hashlib
+import base64
+import mmap
+import os
+
+class blobstore():
+    def __init__(self, localdir):
+        self.blobdir = os.path.join(localdir, 'blobs')
+
+    def path(self, key):
+        # Shard blobs into subdirectories by the first two characters of their key
+        return os.path.join(self.blobdir, key[:2], key)
+
+    def exists(self, key):
+        return os.path.exists(self.path(key))
+
+    def put(self, data):
+        # Save bytes (if not already stored) and return their key
+        key = hashlib.sha256(data).hexdigest()
+        path = self.path(key)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file and rename so that concurrent writers never expose a partial blob
+            # (the temporary file is unique across hosts sharing the volume, not just across this host's pids)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f'{os.path.basename(path)}.', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        return key
+
+    def put_uri(self, uri):
+        # Save a base64 encoded data URI (i.e. "data:image/jpeg;base64,...") and return its key
+        return self.put(base64.b64decode(uri.split(',')[1]))
+
+    def get(self, key):
+        # Return a blob's bytes as a read-only memory map (legacy data URIs are decoded instead)
+        if key.startswith('data:'):
+            return base64.b64decode(key.split(',')[1])
+        with open(self.path(key), 'rb') as f:
+            # Empty files cannot be memory mapped
+            if os.fstat(f.fileno()).st_size == 0:
+                return b''
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
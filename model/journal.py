@@ -0,0 +1,75 @@
+#!/usr/bin/env python
+
+'''
+* Durable, append-only journal of modeled records for a data set being collected
+* Each finished work item is appended (and synced to disk) as soon as it completes, so an
+  interrupted collection can be resumed by skipping the work items already journaled
+* The journal is compacted into the data set file once collection finishes
+'''
+
+import pandas as pd
+import json
+import os
+
+class journal():
+    def __init__(self, localdir, ds):
+        self.ds = ds
+        self.path = os.path.join(localdir, f'ds{ds}.journal')
+        self.file = None
+        # Number of unparseable lines skipped by the last read of the journal
+        self.skipped = 0
+
+    def entries(self):
+        # Yield every complete entry in the journal (a partially written last line is skipped and counted)
+        self.skipped = 0
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    self.skipped += 1
+                    continue
+
+    def keys(self):
+        # Return the keys of all work items already journaled
+        return set(entry['key'] for entry in self.entries())
+
+    def reset(self):
+        # Start a new, empty journal
+        self.close()
+        open(self.path, 'w').close()
+
+    def truncate(self):
+        # Cut a partially written last line (left by a crash mid-write) off the journal, so appending starts on a new line
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'rb+') as f:
+            data = f.read()
+            if data and not data.endswith(b'\n'):
+                f.truncate(data.rfind(b'\n') + 1)
+
+    def append(self, key, records):
+        # Append a finished work item's records and sync them to disk
+        if not self.file:
+            self.truncate()
+            self.file = open(self.path, 'a')
+        self.file.write(f'{json.dumps({"key": key, "records": records})}\n')
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def dataframe(self):
+        # Compile every journaled record into one dataframe
+        return pd.DataFrame([record for entry in self.entries() for record in entry['records']])
+
+    def close(self):
+        if self.file:
+            self.file.close()
+            self.file = None
+
+    def remove(self):
+        # Delete the journal (once it has been compacted into the data set file)
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
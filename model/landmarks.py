@@ -0,0 +1,101 @@
+#!/usr/bin/env python
+
+'''
+* Landmark tensor store for data set 5: every contestant's 68 dlib landmarks in one contiguous
+  .npy file of (id, face_photo, valid, points) rows, where points is the (68, 2) int16 tensor
+* Ids, the blob key of the face each row's landmarks were found on, and whether the face had any
+  landmarks are kept in the same file as the tensor, so one rename replaces all of them at once and
+  rows can be checked against the data set 5 file they were saved with
+* The file is memory-mapped when read, so loading every contestant's geometry costs a page-in
+  of only the rows that are used, and slices of it are zero-copy views
+'''
+
+import numpy as np
+import tempfile
+import json
+import os
+
+class landmark_store():
+    def __init__(self, localdir, ds=5):
+        self.path = os.path.join(localdir, f'ds{ds}_landmarks.npy')
+        # Id index kept alongside the tensor by earlier versions
+        self.legacy_index_path = os.path.join(localdir, f'ds{ds}_landmarks.json')
+
+    def exists(self):
+        return os.path.exists(self.path) and not self.legacy()
+
+    def legacy(self):
+        # Whether the store was saved by an earlier version (a bare tensor with a separate json id index)
+        return os.path.exists(self.legacy_index_path)
+
+    def save(self, ids, faces, dlib_landmarks):
+        # Stack 68x2 landmark lists (i.e. the dlib_landmarks column) into one int16 tensor, keeping each row's id,
+        # face_photo blob key, and whether it has landmarks at all
+        ids = [str(id) for id in ids]
+        faces = [str(face) for face in faces]
+        dtype = [('id', f'U{max([len(id) for id in ids], default=1)}'), ('face', f'U{max([len(face) for face in faces], default=1)}'), ('valid', np.bool_), ('points', np.int16, (68, 2))]
+        table = np.zeros(len(ids), dtype=dtype)
+        table['id'] = ids
+        table['face'] = faces
+        for row, points in enumerate(dlib_landmarks):
+            if len(points) > 0:
+                table['points'][row] = np.vstack(points)
+                table['valid'][row] = True
+        # Write to a temporary file and move it into place, so readers never see a partial store
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, table)
+            os.replace(tmp_path, self.path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+        if os.path.exists(self.legacy_index_path):
+            os.remove(self.legacy_index_path)
+
+    def load(self):
+        # Return the memory-mapped (read-only) table and its id -> row index
+        table = np.load(self.path, mmap_mode='r')
+        if table.dtype.names is None:
+            raise ValueError(f'{self.path} was saved by an earlier version; read data set 5 to migrate it')
+        return table, {id: row for row, id in enumerate(table['id'].tolist())}
+
+    def load_legacy(self):
+        # Return the landmarks saved by an earlier version as an id -> (68, 2) array dict
+        tensor = np.load(self.path)
+        with open(self.legacy_index_path, 'r') as f:
+            ids = json.load(f)
+        if len(ids) != len(tensor):
+            raise ValueError(f'{self.legacy_index_path} does not match {self.path}')
+        return {id: tensor[row] for row, id in enumerate(ids)}
+
+    def match(self, ids, faces):
+        # Return the row of each contestant in the table (-1 where the stored row is missing or was saved
+        # for a different face, i.e. the store and data set 5 file are from different saves)
+        table, index = self.load()
+        stored_faces = table['face']
+        rows = np.array([index.get(str(id), -1) for id in ids], dtype=np.int64)
+        for i, face in enumerate(faces):
+            if rows[i] >= 0 and stored_faces[rows[i]] != str(face):
+                rows[i] = -1
+        return table, rows
+
+    def rows(self, ids, faces=None):
+        # Return the landmarks of the given contestants and whether each of their faces had landmarks: a
+        # zero-copy view when they are stored contiguously and in order (i.e. every contestant), otherwise
+        # a copy of just their rows
+        # With their face_photo blob keys, the rows are also checked to be from the same save as data set 5
+        if faces is None:
+            table, index = self.load()
+            rows = np.array([index.get(str(id), -1) for id in ids], dtype=np.int64)
+        else:
+            table, rows = self.match(ids, faces)
+        if np.any(rows < 0):
+            raise ValueError(f'{np.count_nonzero(rows < 0)} contestants are missing from {os.path.basename(self.path)} or do not match data set 5; rerun transform.py to rebuild it')
+        if len(rows) == 0:
+            table = table[:0]
+        elif np.all(np.diff(rows) == 1):
+            table = table[rows[0]:rows[-1] + 1]
+        else:
+            table = table[rows]
+        return table['points'], np.asarray(table['valid'])
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+'''
+* Persistent cache of transformation results keyed by a hash of everything that determines them
+  (i.e. the photo's blob key with the models and settings that preprocessed it, or a face's
+  landmarks with the version of the algorithm that evaluated it)
+* Unchanged photos and faces are not preprocessed or evaluated again on later runs
+* Hits and misses are counted per namespace (and reported to telemetry) to report hit rates
+'''
+
+import telemetry
+import hashlib
+import sqlite3
+import json
+
+SCHEMA = '''
+create table if not exists results (
+    namespace text not null,
+    key text not null,
+    value text not null,
+    primary key (namespace, key)
+);
+'''
+
+# Maximum number of keys looked up per query (SQLite's limit on host parameters is 999 by default)
+LOOKUP_BATCH = 500
+
+def digest(*parts):
+    # Hash json serializable parts (or bytes) into a cache key
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part if isinstance(part, bytes) else json.dumps(part, sort_keys=True).encode('utf-8'))
+    return h.hexdigest()
+
+class result_cache():
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.db.executescript(SCHEMA)
+        self.stats = {}
+
+    def count(self, namespace, hits, misses):
+        stats = self.stats.setdefault(namespace, {'hits': 0, 'misses': 0})
+        stats['hits'] += hits
+        stats['misses'] += misses
+        telemetry.count('result_cache', hits, namespace=namespace, result='hit')
+        telemetry.count('result_cache', misses, namespace=namespace, result='miss')
+
+    def get_many(self, namespace, keys):
+        # Return a dict of the cached values of the given keys (missing keys are left out)
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        for i in range(0, len(keys), LOOKUP_BATCH):
+            batch = keys[i:i + LOOKUP_BATCH]
+            rows = self.db.execute(f'''select key, value from results where namespace = ? and key in ({', '.join('?' * len(batch))})''', (namespace, *batch))
+            found.update((key, json.loads(value)) for key, value in rows)
+        self.count(namespace, len(found), len(keys) - len(found))
+        return found
+
+    def get(self, namespace, key):
+        # Return (True, value) if the key is cached, otherwise (False, None)
+        found = self.get_many(namespace, [key])
+        return (True, found[key]) if key in found else (False, None)
+
+    def put_many(self, namespace, items):
+        # Cache (key, value) pairs, replacing any values already cached under the same keys
+        self.db.execute('begin immediate')
+        try:
+            self.db.executemany('insert or replace into results (namespace, key, value) values (?, ?, ?)', [(namespace, key, json.dumps(value)) for key, value in items])
+            self.db.execute('commit')
+        except Exception:
+            self.db.execute('rollback')
+            raise
+
+    def put(self, namespace, key, value):
+        self.put_many(namespace, [(key, value)])
+
+    def report(self):
+        # Print the hit rate of each namespace looked up by this process
+        for namespace, stats in self.stats.items():
+            total = stats['hits'] + stats['misses']
+            if total > 0:
+                print(f'''  📈 {namespace} cache: {stats['hits']}/{total} hits ({100 * stats['hits'] / total:.0f}%)''')
+
+    def close(self):
+        self.db.close()
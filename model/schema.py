@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+
+'''
+* Compiled data set schemas: each data set's data model is compiled once into a converter per field,
+  and raw records are modeled a whole batch at a time, one field (column) at a time
+* Places of contestants in a season are ranked within each (show, season) group with array operations
+'''
+
+import functools
+import pandas as pd
+import numpy as np
+import math
+import uuid
+import re
+
+ELIMINATION_WEEK_PATTERN = re.compile(r'winner|runner-{0,1}up|week [1-9][0-9]{0,1}|episode [1-9][0-9]{0,1}')
+
+# Marks a field that is left out of the modeled record (values that can't be converted to the field's type)
+OMIT = object()
+
+@functools.lru_cache(maxsize=None)
+def normalize_key(key):
+    # Raw records share a handful of keys, so each key is only normalized once
+    return key.replace('(','').replace(')','').replace(':','').replace('-','').replace(' ','_').lower()
+
+def show(default):
+    def convert(value):
+        if type(value) == str:
+            lowered = value.lower()
+            if 'bachelorette' in lowered:
+                return 1
+            elif 'bachelor' in lowered:
+                return 0
+            print(f'Value {value} was not able to be evaluated as The Bachelor or The Bachelorette')
+            return -1
+        if not math.isnan(value):
+            print(f'Value {value} was not able to be evaluated as The Bachelor or The Bachelorette')
+        return -1
+    return convert
+
+def yes_no(default):
+    def convert(value):
+        if type(value) == str:
+            lowered = value.lower()
+            if 'yes' in lowered:
+                return 1
+            elif 'no' in lowered:
+                return 0
+            print(f'Value {value} was not able to be evaluated as yes or no')
+            return -1
+        if not math.isnan(value):
+            print(f'Value {value} was not able to be evaluated as yes or no')
+        return -1
+    return convert
+
+def eliminated(default):
+    def convert(value):
+        if type(value) == float and math.isnan(value):
+            return ''
+        try:
+            elimination_str = ELIMINATION_WEEK_PATTERN.findall(value.lower())
+        except ValueError:
+            print(f'Value {value} was not able to be cast to string')
+            return ''
+        if len(elimination_str) > 0:
+            # Save last instance of regex pattern match
+            return elimination_str[-1].replace('episode','week').replace('-','')
+        return ''
+    return convert
+
+def boolean(default):
+    def convert(value):
+        if value != None:
+            if value:
+                return 1
+            elif not value:
+                return 0
+        return -1
+    return convert
+
+def cast(default):
+    # Cast to the type of the field's default value
+    kind = type(default)
+    def convert(value):
+        if type(value) == kind and kind in (int, str):
+            return value
+        if type(value) == float and math.isnan(value):
+            if kind == int:
+                return -1
+            elif kind == str:
+                return ''
+            return OMIT
+        try:
+            return kind(value)
+        except ValueError:
+            if kind == int:
+                print(f'Value {value} was not able to be cast to integer')
+                return -1
+            elif kind == str:
+                print(f'Value {value} was not able to be cast to string')
+                return ''
+            return OMIT
+    return convert
+
+# Converters of fields that need more than a cast to their default value's type
+CONVERTERS = {
+    'show': show,
+    'proposal': yes_no,
+    'still_together': yes_no,
+    'eliminated': eliminated,
+    'is_private': boolean,
+    'photo1_comments_disabled': boolean,
+    'photo2_comments_disabled': boolean,
+    'photo3_comments_disabled': boolean
+}
+
+class schema():
+    def __init__(self, model):
+        # Compile the data model into (field, default value, converter) triples
+        self.model = model
+        self.fields = [(key, value, CONVERTERS.get(key, cast)(value)) for key, value in model.items()]
+
+    def apply(self, datas):
+        # Model a batch of raw records, returning only the records that aren't empty
+        rows = []
+        # Raw records from one scraper share their keys, so normalize each set of keys once
+        normalized = {}
+        for data in datas:
+            if type(data) == dict:
+                keys = tuple(data)
+                if keys not in normalized:
+                    normalized[keys] = tuple(normalize_key(key) for key in keys)
+                # Records whose keys are already normalized are used as is (rows are never modified)
+                rows.append(data if normalized[keys] == keys else dict(zip(normalized[keys], data.values())))
+            else:
+                print('  💔 Only a json object is permitted')
+        # Convert one field of every record at a time
+        columns = []
+        for key, value, convert in self.fields:
+            if key == 'id':
+                # If id has not yet been set, set it now (this should only be applicable when modeling data set 2)
+                columns.append([convert(row[key]) if key in row else str(uuid.uuid4()) for row in rows])
+            else:
+                columns.append([convert(row[key]) if key in row else value for row in rows])
+        keys = [key for key, value, convert in self.fields]
+        modeled_datas = []
+        for values in zip(*columns):
+            modeled_data = {key: value for key, value in zip(keys, values) if value is not OMIT}
+            # Records that only contain default values are empty
+            if modeled_data != self.model:
+                modeled_datas.append(modeled_data)
+        return modeled_datas
+
+def places(shows, seasons, eliminated):
+    # Return each contestant's place in their season and the order of contestants grouped by season
+    # The winner and runner-up place 1 and 2; everyone else places by their (descending) elimination week
+    # Seasons are numbered in the order they first appear
+    season_codes = pd.factorize(np.array([f'{show}{season}' for show, season in zip(shows, seasons)], dtype=object))[0]
+    eliminated = np.array(eliminated, dtype=object)
+    # Integer codes that sort like the elimination weeks
+    week_codes, weeks = pd.factorize(eliminated, sort=True)
+    winner = eliminated == 'winner'
+    runnerup = eliminated == 'runnerup'
+    finalist = winner | runnerup
+    # Group-by rank (ties share the lowest place): count the season's other contestants eliminated in a later week
+    # by searching a sorted array of (season, descending week) keys
+    stride = len(weeks) + 1
+    keys = season_codes * stride + (len(weeks) - week_codes)
+    sorted_keys = np.sort(keys[~finalist])
+    later = np.searchsorted(sorted_keys, keys, side='left') - np.searchsorted(sorted_keys, season_codes * stride, side='left')
+    place = np.where(winner, 1, np.where(runnerup, 2, later + 3))
+    # Seasons keep the order they first appear in, and contestants keep their order within a season
+    order = np.argsort(season_codes, kind='stable')
+    return place.astype(int), order
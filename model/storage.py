@@ -0,0 +1,56 @@
+#!/usr/bin/env python
+
+'''
+* Storage backends for modeled data sets
+* Columnar backends (Parquet, Arrow IPC/Feather) are compressed and support column projection,
+  so reading a few columns of a data set does not load every photo into memory
+'''
+
+import pandas as pd
+
+class pickle_backend():
+    # Legacy backend: pickled (serialized) pandas dataframes
+    extension = 'pkl'
+
+    def save(self, df, path):
+        df.to_pickle(path)
+
+    def load(self, path, columns=None):
+        # Pickles cannot be partially read, so project after loading
+        df = pd.read_pickle(path)
+        if columns:
+            df = df[columns]
+        return df
+
+class parquet_backend():
+    extension = 'parquet'
+
+    def __init__(self, compression='zstd'):
+        self.compression = compression
+
+    def save(self, df, path):
+        df.to_parquet(path, compression=self.compression, index=False)
+
+    def load(self, path, columns=None):
+        return pd.read_parquet(path, columns=columns)
+
+class feather_backend():
+    # Arrow IPC file format
+    extension = 'arrow'
+
+    def __init__(self, compression='zstd'):
+        self.compression = compression
+
+    def save(self, df, path):
+        # Feather requires a default index
+        df.reset_index(drop=True).to_feather(path, compression=self.compression)
+
+    def load(self, path, columns=None):
+        return pd.read_feather(path, columns=columns)
+
+# Storage backends keyed by name
+BACKENDS = {
+    'pickle': pickle_backend,
+    'parquet': parquet_backend,
+    'feather': feather_backend
+}
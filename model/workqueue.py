@@ -0,0 +1,179 @@
+#!/usr/bin/env python
+
+'''
+* Durable work queue shared by any number of worker processes, containers, or hosts through one
+  SQLite file (i.e. on a shared volume)
+* Workers claim a task by taking a lease on it and keep the lease alive with heartbeats; a task
+  whose lease expires (i.e. its worker died or hung) is claimed again by another worker
+* Failed and expired tasks are retried until they've been attempted max_attempts times
+* Each task is keyed by its kind and a key unique within that kind, so enqueueing is idempotent
+'''
+
+import threading
+import sqlite3
+import socket
+import json
+import time
+import os
+
+SCHEMA = '''
+create table if not exists tasks (
+    id integer primary key autoincrement,
+    kind text not null,
+    key text not null,
+    payload text not null,
+    state text not null default 'pending',
+    attempts integer not null default 0,
+    owner text,
+    lease_expires real not null default 0,
+    result text,
+    error text,
+    updated real not null,
+    unique (kind, key)
+);
+create index if not exists tasks_claim on tasks (state, kind, id);
+'''
+
+def worker_name():
+    # Identify a worker process across hosts and containers
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+class workqueue():
+    def __init__(self, path, lease=60, max_attempts=3):
+        self.path = path
+        self.lease = lease
+        self.max_attempts = max_attempts
+        # Autocommit mode: every write either runs alone or inside an explicit "begin immediate" transaction
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None)
+        self.db.executescript(SCHEMA)
+
+    def enqueue(self, kind, tasks):
+        # Add (key, payload) tasks of a kind; tasks already queued are left alone, and failed tasks are queued again
+        now = time.time()
+        self.db.execute('begin immediate')
+        try:
+            before = self.db.total_changes
+            self.db.executemany('''
+                insert into tasks (kind, key, payload, updated) values (?, ?, ?, ?)
+                on conflict (kind, key) do update set
+                    payload = excluded.payload, state = 'pending', attempts = 0, owner = null, lease_expires = 0, error = null, updated = excluded.updated
+                where tasks.state = 'failed'
+            ''', [(kind, str(key), json.dumps(payload), now) for key, payload in tasks])
+            added = self.db.total_changes - before
+            self.db.execute('commit')
+        except Exception:
+            self.db.execute('rollback')
+            raise
+        return added
+
+    def claim(self, owner, kinds):
+        # Lease the oldest pending task (or task with an expired lease) of the given kinds
+        # Returns a dict of the task, or None if there's nothing to claim right now
+        now = time.time()
+        marks = ', '.join('?' * len(kinds))
+        self.db.execute('begin immediate')
+        try:
+            # Give up on tasks whose last attempt's lease expired
+            self.db.execute(f'''
+                update tasks set state = 'failed', error = 'lease expired', owner = null, updated = ?
+                where state = 'leased' and lease_expires < ? and attempts >= ? and kind in ({marks})
+            ''', (now, now, self.max_attempts, *kinds))
+            row = self.db.execute(f'''
+                select id, kind, key, payload, attempts from tasks
+                where kind in ({marks}) and ((state = 'pending' and lease_expires <= ?) or (state = 'leased' and lease_expires < ?))
+                order by id limit 1
+            ''', (*kinds, now, now)).fetchone()
+            if row:
+                self.db.execute('''
+                    update tasks set state = 'leased', attempts = attempts + 1, owner = ?, lease_expires = ?, updated = ?
+                    where id = ?
+                ''', (owner, now + self.lease, now, row[0]))
+            self.db.execute('commit')
+        except Exception:
+            self.db.execute('rollback')
+            raise
+        if not row:
+            return None
+        return {'id': row[0], 'kind': row[1], 'key': row[2], 'payload': json.loads(row[3]), 'attempts': row[4] + 1}
+
+    def heartbeat(self, task, owner):
+        # Extend a task's lease; returns False if the lease was lost (i.e. it expired and another worker claimed the task)
+        now = time.time()
+        cursor = self.db.execute('''
+            update tasks set lease_expires = ?, updated = ? where id = ? and owner = ? and state = 'leased'
+        ''', (now + self.lease, now, task['id'], owner))
+        return cursor.rowcount == 1
+
+    def complete(self, task, owner, result):
+        # Store a task's result; returns False if the lease was lost (the result is then discarded)
+        cursor = self.db.execute('''
+            update tasks set state = 'done', result = ?, error = null, updated = ? where id = ? and owner = ? and state = 'leased'
+        ''', (json.dumps(result), time.time(), task['id'], owner))
+        return cursor.rowcount == 1
+
+    def fail(self, task, owner, error, delay=0):
+        # Release a failed task to be retried (by any worker) after delay seconds, or mark it failed once it has been
+        # attempted max_attempts times
+        now = time.time()
+        cursor = self.db.execute('''
+            update tasks set state = case when attempts >= ? then 'failed' else 'pending' end, owner = null, lease_expires = ?, error = ?, updated = ?
+            where id = ? and owner = ? and state = 'leased'
+        ''', (self.max_attempts, now + delay, str(error), now, task['id'], owner))
+        return cursor.rowcount == 1
+
+    def results(self, kind):
+        # Yield (key, result) of every done task of a kind
+        for key, result in self.db.execute("select key, result from tasks where kind = ? and state = 'done' order by id", (kind,)):
+            yield key, json.loads(result)
+
+    def failures(self, kind):
+        # Yield (key, error) of every task of a kind that failed every attempt
+        yield from self.db.execute("select key, error from tasks where kind = ? and state = 'failed' order by id", (kind,))
+
+    def counts(self, kinds=None):
+        # Return the number of tasks in each state, i.e. {'pending': 10, 'leased': 2, 'done': 40, 'failed': 1}
+        query = 'select state, count(*) from tasks'
+        params = ()
+        if kinds:
+            query += f''' where kind in ({', '.join('?' * len(kinds))})'''
+            params = tuple(kinds)
+        counts = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        counts.update(dict(self.db.execute(f'{query} group by state', params)))
+        return counts
+
+    def remove(self, kind, states=('done', 'failed')):
+        # Delete a kind's finished tasks (once their results have been compacted into a data set)
+        self.db.execute(f'''delete from tasks where kind = ? and state in ({', '.join('?' * len(states))})''', (kind, *states))
+
+    def close(self):
+        self.db.close()
+
+class keepalive():
+    # Context manager heartbeating a task's lease from a background thread (over its own connection) while the task runs
+    # Heartbeats stop once the task has run for max_age seconds (if given), so the lease of a hung task expires and
+    # the task is claimed by another worker
+    def __init__(self, queue, task, owner, max_age=0):
+        self.queue = queue
+        self.task = task
+        self.owner = owner
+        self.max_age = max_age
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        queue = workqueue(self.queue.path, self.queue.lease, self.queue.max_attempts)
+        started = time.monotonic()
+        while not self.stopped.wait(self.queue.lease / 3):
+            if self.max_age and time.monotonic() - started > self.max_age:
+                break
+            if not queue.heartbeat(self.task, self.owner):
+                break
+        queue.close()
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stopped.set()
+        self.thread.join()
@@ -0,0 +1,194 @@
+#!/usr/bin/env python
+
+'''
+Dependency-driven task scheduler
+    * Tasks are coroutines that spawn their dependents as soon as their own results are ready,
+      so the task graph unfolds while it runs instead of waiting on whole stages
+    * Network-bound tasks run on the event loop (see scrapers.fetch) and CPU-bound functions run
+      on a process pool, so both kinds of work overlap
+    * imap_unordered streams a multiprocessing pool's results in completion order while keeping a
+      bounded window of chunks in flight, so the parent never holds more than a window of results
+    * CPU-bound tasks may be given a deadline: a task that overruns it raises a TimeoutError, and a
+      worker stuck past it (i.e. inside dlib or OpenCV) exits and is replaced
+    * Failed tasks are retried with jittered exponential backoff, and items that fail every attempt
+      are reported instead of stalling the run
+'''
+
+import concurrent.futures
+import faulthandler
+import itertools
+import asyncio
+import random
+import signal
+import heapq
+import queue
+import time
+
+# Seconds a worker stuck past its task's deadline is given before it exits
+DEADLINE_GRACE = 10
+
+def backoff(attempt, base=1.0, cap=60.0):
+    # Full jitter exponential backoff: a random delay of up to base * 2^attempt seconds (at most cap)
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+class deadline():
+    # Bound the time a pool worker spends on a task (no bound if seconds is 0): a TimeoutError is raised in the
+    # task after the given seconds (i.e. in a hung request), and if the task can't be interrupted (i.e. it's stuck
+    # in C code), the worker dumps its traceback to stderr and exits DEADLINE_GRACE seconds later
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def expire(self, signum, frame):
+        raise TimeoutError(f'task exceeded its {self.seconds:g}s deadline')
+
+    def __enter__(self):
+        if self.seconds > 0:
+            signal.signal(signal.SIGALRM, self.expire)
+            signal.setitimer(signal.ITIMER_REAL, self.seconds)
+            faulthandler.dump_traceback_later(self.seconds + DEADLINE_GRACE, exit=True)
+        return self
+
+    def __exit__(self, *exc):
+        if self.seconds > 0:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+            faulthandler.cancel_dump_traceback_later()
+
+class scheduler():
+    def __init__(self, cpu_workers=5, initializer=None, initargs=(), timeout=0, retries=0, max_tasks_per_child=0):
+        # Process pool for CPU-bound functions
+        self.cpu_workers = cpu_workers
+        self.initializer = initializer
+        self.initargs = initargs
+        self.executor = self.pool()
+        # Deadline (in seconds) and number of retries of each CPU-bound function call
+        self.timeout = timeout
+        self.retries = retries
+        # Replace the pool's processes after about this many calls each (0 never replaces them)
+        self.max_tasks_per_child = max_tasks_per_child
+        self.submitted = 0
+        # Spawned tasks that have not finished yet, and names of those that raised
+        self.tasks = set()
+        self.failed = []
+
+    async def guard(self, coro, name):
+        # Report a failed task instead of tearing down the whole graph
+        try:
+            return await coro
+        except Exception as e:
+            print(f'  💔 {name}: {e}')
+            self.failed.append(name)
+            return None
+
+    def spawn(self, coro, name=''):
+        # Schedule a task to run concurrently with every other task in the graph
+        task = asyncio.ensure_future(self.guard(coro, name))
+        self.tasks.add(task)
+        task.add_done_callback(self.tasks.discard)
+        return task
+
+    def pool(self):
+        return concurrent.futures.ProcessPoolExecutor(max_workers=self.cpu_workers, initializer=self.initializer, initargs=self.initargs)
+
+    def replace(self, executor):
+        # Replace the process pool (once, however many tasks find it broken); the old pool's workers exit once their tasks are done
+        if executor is self.executor:
+            self.executor = self.pool()
+            self.submitted = 0
+            executor.shutdown(wait=False)
+
+    async def cpu(self, func, *args):
+        # Run a CPU-bound function on the process pool within its deadline, retrying it with backoff if it fails
+        loop = asyncio.get_running_loop()
+        for attempt in range(self.retries + 1):
+            # Recycle the pool's processes once they've each run max_tasks_per_child tasks
+            if self.max_tasks_per_child and self.submitted >= self.max_tasks_per_child * self.cpu_workers:
+                self.replace(self.executor)
+            self.submitted += 1
+            executor = self.executor
+            try:
+                return (await loop.run_in_executor(executor, run_chunk, func, [args], self.timeout))[0]
+            except Exception as e:
+                # A worker that exited (i.e. past its deadline or after crashing) breaks the whole pool, so start a new one
+                if isinstance(e, concurrent.futures.process.BrokenProcessPool):
+                    self.replace(executor)
+                if attempt == self.retries:
+                    raise
+                await asyncio.sleep(backoff(attempt))
+
+    async def drain(self):
+        # Wait until every task, including tasks spawned by other tasks, has finished
+        while self.tasks:
+            await asyncio.gather(*list(self.tasks))
+
+    def close(self):
+        self.executor.shutdown()
+
+def run_chunk(func, chunk, timeout=0):
+    # Run a function over a chunk of argument tuples in a pool worker, within a deadline of timeout seconds per item
+    with deadline(timeout * len(chunk)):
+        return [func(*args) for args in chunk]
+
+def imap_unordered(pool, func, items, window, chunksize=1, timeout=0, retries=0, failed=None):
+    # Yield func(*args) for every argument tuple in items, in completion order, submitting chunks of
+    # chunksize items to the pool with at most window chunks in flight (items are read lazily)
+    # A failed chunk is retried (after a jittered exponential backoff) up to retries times; the argument tuples and
+    # errors of chunks that fail every attempt are appended to failed, or the error is raised if failed is None
+    # With a timeout (seconds per item), each chunk runs within a deadline, and since a worker stuck past its deadline
+    # exits (and is replaced by the pool) without reporting back, chunks still in flight once nothing has finished
+    # for longer than any chunk may run are presumed lost and retried
+    items = iter(items)
+    results = queue.Queue()
+    tokens = itertools.count()
+    in_flight = {}
+    backing_off = []
+    lost_after = timeout * chunksize + 2 * DEADLINE_GRACE
+    def submit(chunk, attempt):
+        token = next(tokens)
+        in_flight[token] = (chunk, attempt)
+        pool.apply_async(run_chunk, (func, chunk, timeout), callback=lambda result: results.put((token, result)), error_callback=lambda e: results.put((token, e)))
+    def refill():
+        while len(in_flight) + len(backing_off) < window:
+            chunk = list(itertools.islice(items, chunksize))
+            if len(chunk) == 0:
+                return
+            submit(chunk, 0)
+    def retry(chunk, attempt, error):
+        if attempt < retries:
+            heapq.heappush(backing_off, (time.monotonic() + backoff(attempt), next(tokens), chunk, attempt + 1))
+        elif failed is None:
+            raise error
+        else:
+            failed.extend((args, error) for args in chunk)
+    refill()
+    finished = time.monotonic()
+    while in_flight or backing_off:
+        # Resubmit retried chunks once they've backed off
+        while backing_off and backing_off[0][0] <= time.monotonic():
+            ready, token, chunk, attempt = heapq.heappop(backing_off)
+            submit(chunk, attempt)
+        waits = [backing_off[0][0] - time.monotonic()] if backing_off else []
+        if timeout > 0 and in_flight:
+            waits.append(finished + lost_after - time.monotonic())
+        try:
+            token, result = results.get(timeout=max(0, min(waits)) if waits else None)
+        except queue.Empty:
+            if timeout > 0 and in_flight and time.monotonic() - finished > lost_after:
+                lost = list(in_flight.values())
+                in_flight.clear()
+                for chunk, attempt in lost:
+                    retry(chunk, attempt, TimeoutError(f'task was lost after exceeding its {timeout * len(chunk):g}s deadline'))
+                finished = time.monotonic()
+                refill()
+            continue
+        finished = time.monotonic()
+        # Ignore late results of chunks already presumed lost
+        if token not in in_flight:
+            continue
+        chunk, attempt = in_flight.pop(token)
+        if isinstance(result, BaseException):
+            retry(chunk, attempt, result)
+            refill()
+            continue
+        # Refill the window before handing the finished chunk's results to the caller
+        refill()
+        yield from result
@@ -1,5 +1,7 @@
 #!/usr/bin/env python
 
 from . import bachelornation
+from . import fetch
+from . import images
 from . import instagram
 from . import wikipedia
@@ -1,12 +1,30 @@
 #!/usr/bin/env python
 
-from bs4 import BeautifulSoup
+import lxml.etree
+import lxml.html
 import pandas as pd
 import requests
 import random
-import base64
+import io
 import re
 
+# XPath predicate matching elements with a given class (like BeautifulSoup's class_ for a single class)
+def has_class(name):
+    return f'contains(concat(" ", normalize-space(@class), " "), " {name} ")'
+
+# Compiled XPath selectors for the parts of fandom pages that are parsed
+NO_ARTICLE = lxml.etree.XPath('//div[@class="noarticletext mw-content-ltr"]')
+GALLERY_ITEMS = lxml.etree.XPath(f'//div[{has_class("wikia-gallery-item")}]')
+GALLERY_CAPTION = lxml.etree.XPath(f'.//div[{has_class("lightbox-caption")}]')
+ARTICLE_TABLES = lxml.etree.XPath(f'//table[{has_class("article-table")}]')
+HEADSHOT = lxml.etree.XPath(f'//img[{has_class("pi-image-thumbnail")}]')
+INFOBOX_ITEMS = lxml.etree.XPath('//div[@class="pi-item pi-data pi-item-spacing pi-border-color"]')
+CONTENT_PARAGRAPHS = lxml.etree.XPath('(//div[@id="content"])[1]//p')
+
+def first(elements):
+    # First element of an XPath result (like BeautifulSoup's find), or None
+    return elements[0] if len(elements) > 0 else None
+
 def select_ua():
     user_agents = [
         'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.36',
@@ -21,143 +39,155 @@ def select_ua():
     ]
     return random.choice(user_agents)
 
-def scrape_season(show, season):
-    # Initialize list of contestants
-    contestants = []
+def season_url(show, season):
     # Select URL
     if show == 'bachelor':
-        url = f'https://bachelor-nation.fandom.com/wiki/The_Bachelor_(Season_{season})'
+        return f'https://bachelor-nation.fandom.com/wiki/The_Bachelor_(Season_{season})'
     elif show == 'bachelorette':
-        url = f'https://bachelor-nation.fandom.com/wiki/The_Bachelorette_(Season_{season})'
+        return f'https://bachelor-nation.fandom.com/wiki/The_Bachelorette_(Season_{season})'
+
+def parse_season(html, show, season):
+    # Initialize list of contestants
+    contestants = []
+    # Parse the returned source with lxml
+    doc = lxml.html.document_fromstring(html)
+
+    # Check that there is contents on the page
+    alert_div = first(NO_ARTICLE(doc))
+    if alert_div is not None:
+        print(f'No contents on page for {season}. Skipping.')
+    else:
+        # Define list of known keys
+        keys = ['name', 'age', 'hometown', 'occupation', 'eliminated']
+        # Check for gallery style (common with newer season pages)
+        gallery_items = GALLERY_ITEMS(doc)
+        if len(gallery_items) > 20:
+            # Compile html tag removal regex pattern
+            tag_pattern = re.compile(r'</{0,1}[a-z]{1,5}>')
+            # Iterate over gallery items and save info
+            for item in gallery_items:
+                caption = first(GALLERY_CAPTION(item))
+                if caption is not None:
+                    name = first(caption.xpath('.//a'))
+                    if name is not None:
+                        profile_url = f'''https://bachelor-nation.fandom.com{name.attrib['href']}'''
+                        values = re.split(r'<br\/{0,1}>', lxml.html.tostring(caption, encoding='unicode', with_tail=False))
+                        if len(values) == 5:
+                            contestants.append({
+                                keys[0]: tag_pattern.sub('', name.text_content()),
+                                keys[1]: int(tag_pattern.sub('', values[1].strip())),
+                                keys[2]: tag_pattern.sub('', values[2].strip()),
+                                keys[3]: tag_pattern.sub('', values[3].strip()),
+                                keys[4]: tag_pattern.sub('', values[4].strip()),
+                                'profile_url': tag_pattern.sub('', profile_url),
+                                'season': season,
+                                'show': show
+                            })
+            return contestants
+        # Else, check for table style (commone with older season pages)
+        else:
+            article_tables = ARTICLE_TABLES(doc)
+            if len(article_tables) > 0:
+                # Iterate over tables and check headers
+                for table in article_tables:
+                    # Convert only the html table's subtree to a dataframe
+                    df = pd.read_html(io.StringIO(lxml.html.tostring(table, encoding='unicode', with_tail=False)), header=0)[0]
+                    # Check if column headers are expected
+                    if [col.strip().lower() for col in list(df.columns)] == keys:
+                        # We have confirmed we have the correct table of contestants
+                        # Normalized column names
+                        df = df.rename(columns={col: col.strip().lower() for col in df.columns})
+                        # Add profile_url column
+                        df['profile_url'] = [f'''https://bachelor-nation.fandom.com{a.attrib['href']}''' for a in table.xpath('.//a')]
+                        # Add season column
+                        df['season'] = [season for i in range(len(df.index))]
+                        # Add show column
+                        df['show'] = [show for i in range(len(df.index))]
+                        # Convert dataframe to dict
+                        contestants = [record for record in df.to_dict(orient='records')]
+                        return contestants
+    return contestants
+
+async def scrape_season(fetcher, show, season):
     # Get url and save DOM
-    dom = requests.get(
-            url,
+    dom = await fetcher.get(
+            season_url(show, season),
             headers={'User-Agent':select_ua()}
         )
     # If returned status code if good, continue
     if dom:
-        # Soup-ify the returned source
-        soup = BeautifulSoup(dom.text, 'html.parser')
-
-        # Check that there is contents on the page
-        alert_div = soup.find('div', class_='noarticletext mw-content-ltr')
-        if alert_div:
-            print(f'No contents on page for {season}. Skipping.')
-        else:
-            # Define list of known keys
-            keys = ['name', 'age', 'hometown', 'occupation', 'eliminated']
-            # Check for gallery style (common with newer season pages)
-            gallery_items = soup.findAll('div', class_='wikia-gallery-item')
-            if len(gallery_items) > 20:
-                # Iterate over gallery items and save info
-                for item in gallery_items:
-                    caption = item.find('div', class_='lightbox-caption')
-                    if caption:
-                        name = caption.find('a')
-                        if name:
-                            profile_url = f'''https://bachelor-nation.fandom.com{name['href']}'''
-                            values = re.split(r'<br\/{0,1}>', str(caption))
-                            if len(values) == 5:
-                                # Compile html tag removal regex pattern
-                                tag_pattern = re.compile(r'</{0,1}[a-z]{1,5}>')
-                                contestants.append({
-                                    keys[0]: tag_pattern.sub('', name.text),
-                                    keys[1]: int(tag_pattern.sub('', values[1].strip())),
-                                    keys[2]: tag_pattern.sub('', values[2].strip()),
-                                    keys[3]: tag_pattern.sub('', values[3].strip()),
-                                    keys[4]: tag_pattern.sub('', values[4].strip()),
-                                    'profile_url': tag_pattern.sub('', profile_url),
-                                    'season': season,
-                                    'show': show
-                                })
-                return contestants
-            # Else, check for table style (commone with older season pages)
-            else:
-                article_tables = soup.findAll('table', class_='article-table')
-                if len(article_tables) > 0:
-                    # Iterate over tables and check headers
-                    for table in article_tables:
-                        # Convert html table to dataframe
-                        df = pd.read_html(str(table), header=0)[0]
-                        # Check if column headers are expected
-                        if [col.strip().lower() for col in list(df.columns)] == keys:
-                            # We have confirmed we have the correct table of contestants
-                            # Normalized column names
-                            df = df.rename(columns={col: col.strip().lower() for col in df.columns})
-                            # Add profile_url column
-                            df['profile_url'] = [f'''https://bachelor-nation.fandom.com{a['href']}''' for a in table.findAll('a')]
-                            # Add season column
-                            df['season'] = [season for i in range(len(df.index))]
-                            # Add show column
-                            df['show'] = [show for i in range(len(df.index))]
-                            # Convert dataframe to dict
-                            contestants = [record for record in df.to_dict(orient='records')]
-                            return contestants
-    return contestants
+        return parse_season(dom.text, show, season)
+    return []
 
-def scrape_contestant(contestant):
-    # Initialize data dictionary
-    data = {}
+def contestant_url(contestant):
     # Check if url or name was given
     if not contestant.startswith('http'):
         # Normalize contestant name
         contestant = f'''{contestant[0].upper()}{contestant.split('_')[0][1:]}_{contestant.split('_')[1][0].upper()}{contestant.split('_')[1][1:]}'''
         contestant = f'https://bachelor-nation.fandom.com/wiki/{contestant}'
+    return contestant
+
+def parse_contestant(html, contestant):
+    # Initialize data dictionary and headshot url
+    data = {}
+    headshot_src = None
+    # Parse the returned source with lxml
+    doc = lxml.html.document_fromstring(html)
+
+    # Check that there is contents on the page
+    alert_div = first(NO_ARTICLE(doc))
+    if alert_div is not None:
+        print(f'No contents on page for {contestant}. Skipping.')
+    else:
+        # Parse out headshot
+        headshot = first(HEADSHOT(doc))
+        if headshot is not None:
+            headshot_src = headshot.attrib['src']
+        # Parse out additional categorized info from the infobox
+        for pair in INFOBOX_ITEMS(doc):
+            key = first(pair.xpath('.//h3')).text_content().strip()
+            value = first(pair.xpath('.//div'))
+            # If key is social_media, retrieve and save all social media links as list
+            if key.lower() == 'social media':
+                value = [a.attrib['href'] for a in value.xpath('.//a')]
+            # Otherwise, save the text
+            else:
+                value = value.text_content()
+            data[key] = value
+        # Attempt to find height information included in wiki content
+        for p in CONTENT_PARAGRAPHS(doc):
+            b = first(p.xpath('.//b'))
+            i = first(p.xpath('.//i'))
+            if b is not None and b.text_content().strip().lower() == 'height':
+                data['height'] = p.text_content().lower().replace(b.text_content().strip().lower(),'').strip()
+                if i is not None:
+                    data['height'] = data['height'].replace(i.text_content().strip().lower(),'')
+    return data, headshot_src
+
+async def scrape_contestant(fetcher, contestant):
+    contestant = contestant_url(contestant)
     # Get url and save DOM
-    dom = requests.get(
+    dom = await fetcher.get(
             contestant,
             headers={'User-Agent':select_ua()}
-        ).text
+        )
     # If returned status code if good, continue
-    if dom:
-        # Soup-ify the returned source
-        soup = BeautifulSoup(dom.text, 'html.parser')
-
-        # Check that there is contents on the page
-        alert_div = soup.find('div', class_='noarticletext mw-content-ltr')
-        if alert_div:
-            print(f'No contents on page for {contestant}. Skipping.')
-        else:
-            # Parse out headshot
-            headshot = soup.find('img', class_='pi-image-thumbnail')
-            headshot_b64 = None
-            if headshot:
-                headshot_src = headshot['src']
-                # Download image in temp file
-                try:
-                    r = requests.get(
-                        headshot_src,
-                        headers={'User-Agent':select_ua()}
-                    )
-                    img = f"data:{r.headers['Content-Type']};base64,{base64.b64encode(r.content).decode('utf-8')}"
-                    # Clean memory
-                    del r
-                except requests.exceptions.ConnectionError:
-                    print('  💔 Headshot image not able to be downloaded')
-                    img = None
-                # Save base64 encoded image in json record
-                data['photo'] = img
-            # Parse out additional categorized info
-            infos = soup.findAll('div', class_='pi-item pi-data pi-item-spacing pi-border-color')
-            for pair in infos:
-                key = pair.find('h3').text.strip()
-                value = pair.find('div')
-                # If key is social_media, retrieve and save all social media links as list
-                if key.lower() == 'social media':
-                    value = [a['href'] for a in value.findAll('a')]
-                    #value = f'''{', '.join([a['href'] for a in value.findAll('a')])}'''
-                # Otherwise, save the text
-                else:
-                    value = value.text
-                data[key] = value
-            # Attempt to find height information included in wiki content
-            content = soup.find('div', id='content')
-            ps = content.findAll('p')
-            for p in ps:
-                b = p.find('b')
-                i = p.find('i')
-                if b and b.text.strip().lower() == 'height':
-                    data['height'] = p.text.lower().replace(b.text.strip().lower(),'').strip()
-                    if i:
-                        data['height'] = data['height'].replace(i.text.strip().lower(),'')
+    if not dom:
+        return {}
+    data, headshot_src = parse_contestant(dom.text, contestant)
+    # Download headshot (queued as soon as the page is parsed, while other pages are still in flight)
+    if headshot_src:
+        try:
+            img, width, height = await fetcher.image(
+                headshot_src,
+                headers={'User-Agent':select_ua()}
+            )
+        except requests.exceptions.RequestException:
+            print('  💔 Headshot image not able to be downloaded')
+            img, width, height = None, None, None
+        # Save image bytes in json record (to be put in the blob store by the caller) along with their original dimensions
+        data['photo'] = img
+        if width:
+            data['photo_width'] = width
+            data['photo_height'] = height
     return data
@@ -0,0 +1,88 @@
+#!/usr/bin/env python
+
+'''
+Persistent HTTP response cache for the fetch engine
+    * Bodies and validators (ETag, Last-Modified) are stored on disk keyed by URL
+    * Cached validators turn re-collection into conditional requests (mostly 304 Not Modified)
+    * Cached responses can be replayed without network access (offline mode)
+'''
+
+from requests.structures import CaseInsensitiveDict
+import requests
+import tempfile
+import hashlib
+import json
+import os
+
+# Response headers worth keeping
+CACHED_HEADERS = ['Content-Type', 'ETag', 'Last-Modified']
+
+class response_cache():
+    def __init__(self, cachedir):
+        self.cachedir = cachedir
+
+    def path(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cachedir, key[:2], key)
+
+    def write(self, path, data):
+        # Write to a temporary file and rename so that concurrent writers never expose a partial entry
+        # (the temporary file is unique across hosts sharing the volume, not just across this host's pids)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f'{os.path.basename(path)}.', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def load(self, url):
+        # Return the cached response for a url, or None if it has not been cached
+        path = self.path(url)
+        try:
+            with open(f'{path}.json', 'r') as f:
+                meta = json.load(f)
+            with open(f'{path}.body', 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        r = requests.Response()
+        r.url = url
+        r.status_code = meta['status']
+        r.reason = 'OK'
+        r.headers = CaseInsensitiveDict(meta['headers'])
+        r.encoding = meta['encoding']
+        r._content = body
+        return r
+
+    def store(self, url, r):
+        # Cache a successful response's body and validators under the requested url
+        path = self.path(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        meta = {
+            'url': url,
+            'status': r.status_code,
+            'headers': {key: r.headers[key] for key in CACHED_HEADERS if key in r.headers},
+            'encoding': r.encoding
+        }
+        self.write(f'{path}.body', r.content)
+        self.write(f'{path}.json', json.dumps(meta).encode('utf-8'))
+
+    def validators(self, r):
+        # Conditional request headers for a cached response
+        headers = {}
+        if 'ETag' in r.headers:
+            headers['If-None-Match'] = r.headers['ETag']
+        if 'Last-Modified' in r.headers:
+            headers['If-Modified-Since'] = r.headers['Last-Modified']
+        return headers
+
+def miss(url):
+    # Stand-in response for a url that is not cached in offline mode (falsy, like any error response)
+    r = requests.Response()
+    r.url = url
+    r.status_code = 504
+    r.reason = 'Not cached (offline)'
+    r._content = b''
+    return r
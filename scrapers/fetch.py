@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+'''
+Asynchronous fetch engine shared by the scrapers
+    * One pooled, keep-alive requests session for every host
+    * A token bucket rate limiter per host, so politeness is guaranteed per host rather than per process
+    * Blocking requests run on a thread pool, so page fetches and image downloads from many
+      contestants are in flight at once and only the rate limits bound throughput
+    * GET responses may be cached on disk, revalidated with conditional requests, and replayed offline
+    * Downloaded photos may be normalized (downscaled and re-encoded) before they're handed to the scrapers
+    * Downloads may be capped in size: the body is streamed and abandoned as soon as it exceeds the cap
+    * Every request is reported to telemetry (latency per host, status codes, bytes downloaded, cache hits)
+    * Requests that time out, fail to connect, or are throttled or refused by an overloaded server are
+      retried with jittered exponential backoff
+'''
+
+from requests.adapters import HTTPAdapter
+from scheduler import backoff
+from . import images
+from . import cache
+import concurrent.futures
+import urllib.parse
+import functools
+import telemetry
+import requests
+import asyncio
+import time
+
+# Response status codes worth retrying
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class token_bucket():
+    def __init__(self, rate, burst):
+        # Requests per second and the number of requests that may be made back-to-back
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def reserve(self):
+        # Take a token (going into debt if none are left) and return how long to wait before using it
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+        if self.tokens >= 0:
+            return 0
+        return -self.tokens / self.rate
+
+    async def acquire(self):
+        # Reservations are made without awaiting, so waiters are served in order without a lock
+        delay = self.reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+class engine():
+    def __init__(self, rate=1.0, burst=1, concurrency=16, timeout=30, host_rates=None, cachedir=None, offline=False, max_edge=0, jpeg_quality=90, retries=2):
+        # Default rate limit (requests per second) for each host and any per-host overrides
+        self.rate = rate
+        self.burst = burst
+        self.host_rates = host_rates if host_rates else {}
+        self.timeout = timeout
+        # Number of times a failed request is retried
+        self.retries = retries
+        self.buckets = {}
+        # Share one session (and its keep-alive connection pools) across all requests
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=concurrency, pool_maxsize=concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency)
+        # Optional on-disk response cache; offline mode serves only from the cache
+        self.cache = cache.response_cache(cachedir) if cachedir else None
+        self.offline = offline
+        if self.offline and not self.cache:
+            raise ValueError('Offline mode requires a response cache')
+        # Longest edge (in pixels) of downloaded photos, and the JPEG quality they're re-encoded at (0 keeps photos as downloaded)
+        self.max_edge = max_edge
+        self.jpeg_quality = jpeg_quality
+
+    def bucket(self, url):
+        host = urllib.parse.urlsplit(url).netloc
+        if host not in self.buckets:
+            self.buckets[host] = token_bucket(self.host_rates.get(host, self.rate), self.burst)
+        return self.buckets[host]
+
+    def send(self, method, url, max_bytes=None, **kwargs):
+        # Blocking request; with max_bytes, the body is streamed and the request abandoned once it's too large
+        if max_bytes is None:
+            return self.session.request(method, url, **kwargs)
+        with self.session.request(method, url, stream=True, **kwargs) as r:
+            length = r.headers.get('Content-Length')
+            if length and length.isdigit() and int(length) > max_bytes:
+                raise ValueError(f'{url} is larger than {max_bytes} bytes')
+            body = bytearray()
+            for chunk in r.iter_content(chunk_size=65536):
+                body += chunk
+                if len(body) > max_bytes:
+                    raise ValueError(f'{url} is larger than {max_bytes} bytes')
+            # Keep the body read so far as the response's content
+            r._content = bytes(body)
+        return r
+
+    async def request(self, method, url, bucket=None, **kwargs):
+        # Wait for the host's rate limit (or the given bucket's), then perform the blocking request on the thread pool
+        # (retrying it if it fails)
+        bucket = bucket if bucket else self.bucket(url)
+        kwargs.setdefault('timeout', self.timeout)
+        loop = asyncio.get_running_loop()
+        host = urllib.parse.urlsplit(url).netloc
+        for attempt in range(self.retries + 1):
+            await bucket.acquire()
+            try:
+                with telemetry.timer(f'http:{host}'):
+                    r = await loop.run_in_executor(self.executor, functools.partial(self.send, method, url, **kwargs))
+            except (requests.ConnectionError, requests.Timeout) as e:
+                telemetry.count('http_errors', host=host, error=type(e).__name__)
+                if attempt == self.retries:
+                    raise
+                await asyncio.sleep(backoff(attempt))
+                continue
+            telemetry.count('http_responses', host=host, status=r.status_code)
+            telemetry.count('http_bytes', len(r.content), host=host)
+            if r.status_code not in RETRY_STATUSES or attempt == self.retries:
+                return r
+            # Wait as long as the server asks (in seconds, up to a minute) if that's longer than the backoff
+            retry_after = r.headers.get('Retry-After', '')
+            await asyncio.sleep(max(backoff(attempt), min(int(retry_after), 60) if retry_after.isdigit() else 0))
+        return r
+
+    async def get(self, url, **kwargs):
+        if not self.cache:
+            return await self.request('GET', url, **kwargs)
+        cached = self.cache.load(url)
+        if self.offline:
+            telemetry.count('http_cache', result='hit' if cached else 'miss')
+            return cached if cached else cache.miss(url)
+        # Revalidate cached responses with a conditional request
+        if cached:
+            kwargs['headers'] = {**kwargs.get('headers', {}), **self.cache.validators(cached)}
+        r = await self.request('GET', url, **kwargs)
+        if r.status_code == 304 and cached:
+            telemetry.count('http_cache', result='revalidated')
+            return cached
+        telemetry.count('http_cache', result='stale' if cached else 'miss')
+        if r.status_code == 200:
+            self.cache.store(url, r)
+        return r
+
+    async def image(self, url, **kwargs):
+        # Download a photo, returning its (normalized) bytes and original width and height
+        r = await self.get(url, **kwargs)
+        if not r:
+            return None, None, None
+        if not self.max_edge:
+            return r.content, None, None
+        # Decoding and re-encoding release the GIL, so normalize on the thread pool
+        loop = asyncio.get_running_loop()
+        with telemetry.timer('normalize'):
+            content, width, height = await loop.run_in_executor(self.executor, images.normalize, r.content, self.max_edge, self.jpeg_quality)
+        telemetry.count('image_bytes', len(r.content), stage='downloaded')
+        telemetry.count('image_bytes', len(content), stage='stored')
+        return content, width, height
+
+    async def post(self, url, **kwargs):
+        return await self.request('POST', url, **kwargs)
+
+    def close(self):
+        self.executor.shutdown(wait=False)
+        self.session.close()
@@ -0,0 +1,28 @@
+#!/usr/bin/env python
+
+'''
+Ingest-time normalization of downloaded photos
+    * Photos larger than a maximum edge are decoded once, downscaled, and re-encoded as JPEG before
+      they're stored, so every later stage reads and decodes a smaller photo
+    * The original dimensions of each photo are returned so that they can be kept with its record
+'''
+
+import numpy as np
+
+def normalize(content, max_edge, quality=90):
+    # Return the (possibly downscaled) photo and its original width and height
+    # Photos that already fit are kept byte for byte; content that isn't a photo is kept as is, without dimensions
+    if not content:
+        return content, None, None
+    # OpenCV is only needed (and imported) when photos are normalized, i.e. with --max-edge
+    import cv2
+    img = cv2.imdecode(np.frombuffer(content, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return content, None, None
+    h, w = img.shape[:2]
+    if not max_edge or max(h, w) <= max_edge:
+        return content, w, h
+    scale = max_edge / max(h, w)
+    img_resized = cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+    encoded, buffer = cv2.imencode('.jpg', img_resized, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    return (buffer.tobytes() if encoded else content), w, h
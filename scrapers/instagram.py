@@ -1,13 +1,34 @@
 #!/usr/bin/env python
 
+from .fetch import token_bucket
 import configparser
 import datetime
 import requests
-import base64
+import asyncio
 import ssl
 
+# Largest photo downloaded (in bytes); larger downloads are abandoned
+MAX_PHOTO_BYTES = 10 * 1024 * 1024
+
 class api():
-    def __init__(self, configfile):
+    def __init__(self, configfile, fetcher, max_downloads=4, max_bytes=MAX_PHOTO_BYTES):
+        # Share the scrapers' fetch engine (and its session and rate limits)
+        self.fetcher = fetcher
+        # Bound the number of photos downloading at once and the size of each
+        self.max_downloads = max_downloads
+        self.max_bytes = max_bytes
+        self.downloads = None
+        self.downloads_loop = None
+        # Photos come from the CDN rather than the pages' host, so they get their own rate limit at the fetch engine's
+        # rate with a burst of max_downloads: a profile's photos all start downloading at once instead of one per token
+        self.downloads_bucket = token_bucket(fetcher.rate, max(fetcher.burst, max_downloads))
+        # Profiles can only be replayed from the response cache when offline, so skip authenticating
+        if fetcher.offline:
+            self.is_authed = True
+            self.csrftoken = None
+            self.sessionid = None
+            self.headers = {}
+            return
         # Retrieve Instagram username/password from file
         config = configparser.ConfigParser()
         config.read(configfile)
@@ -15,7 +36,7 @@ class api():
         password = config.get('Instagram', 'password')
         # Authenticate with Instagram
         time = int(datetime.datetime.now().timestamp())
-        r = requests.get('https://www.instagram.com')
+        r = fetcher.session.get('https://www.instagram.com', timeout=fetcher.timeout)
         xcsrftoken = r.cookies['csrftoken']
         # Keep headers consistent
         self.headers = {
@@ -24,7 +45,7 @@ class api():
             'Referer': 'https://www.instagram.com/accounts/login/',
             'x-csrftoken': xcsrftoken
         }
-        login_r = requests.post(
+        login_r = fetcher.session.post(
             'https://www.instagram.com/accounts/login/ajax/',
             data={
                 'username': username,
@@ -32,7 +53,8 @@ class api():
                 'queryParams': {},
                 'optIntoOneTap': 'false'
             },
-            headers=self.headers
+            headers=self.headers,
+            timeout=fetcher.timeout
         )
         # If http status code is good, continue
         if login_r:
@@ -57,14 +79,28 @@ class api():
             self.csrftoken = None
             self.sessionid = None
 
-    def get_profile(self, username):
+    async def download(self, url, **kwargs):
+        # Download one photo, returning its (normalized) bytes and original width and height (None if it failed or was too large)
+        # The semaphore bounding downloads belongs to the running event loop, so create it there
+        loop = asyncio.get_running_loop()
+        if self.downloads_loop is not loop:
+            self.downloads = asyncio.Semaphore(self.max_downloads)
+            self.downloads_loop = loop
+        async with self.downloads:
+            try:
+                return await self.fetcher.image(url, max_bytes=self.max_bytes, bucket=self.downloads_bucket, **kwargs)
+            except Exception as e:
+                print(f'  💔 {e}')
+                return None, None, None
+
+    async def get_profile(self, username):
         # Prepare data var
         data = {}
         # If the object has been authenticated with Instagram, continue
         if self.is_authed:
             # Retreive data from api
             try:
-                r = requests.get(
+                r = await self.fetcher.get(
                         f'https://www.instagram.com/{username}/?__a=1',
                         headers=self.headers,
                         cookies={
@@ -74,9 +110,9 @@ class api():
                     )
             except (ssl.SSLEOFError, requests.exceptions.HTTPError):
                 # Wait and try once more
-                time.sleep(3)
+                await asyncio.sleep(3)
                 try:
-                    r = requests.get(
+                    r = await self.fetcher.get(
                             f'https://www.instagram.com/{username}/?__a=1',
                             headers=self.headers,
                             cookies={
@@ -85,13 +121,13 @@ class api():
                             }
                         )
                 except (ssl.SSLEOFError, requests.exceptions.HTTPError):
-                    print(f'  💔 SSLEOFError or HTTPError prevented retrieving Instagram profile information for {usename}')
+                    print(f'  💔 SSLEOFError or HTTPError prevented retrieving Instagram profile information for {username}')
                     return {}
             # Ensure that json data was returned
             try:
                 ig_data = r.json()
             except ValueError:
-                print(f'  💔 Response from Instagram for user {usename} could not be converted to json')
+                print(f'  💔 Response from Instagram for user {username} could not be converted to json')
                 return {}
             # Continue if good http status code response
             if r:
@@ -110,21 +146,15 @@ class api():
                             data['following'] = None
                         data['name'] = graphql['full_name']
                         data['user_id'] = graphql['id']
-                        # Download and save profile photo
-                        r = requests.get(
+                        # Download the profile photo and three most recent photos concurrently
+                        downloads = [self.download(
                             graphql['profile_pic_url_hd'],
                             headers=self.headers,
                             cookies={
                                 'sessionid': self.sessionid,
                                 'csrftoken': self.csrftoken
                             }
-                        )
-                        if r:
-                            prof_pic = f"data:{r.headers['Content-Type']};base64,{base64.b64encode(r.content).decode('utf-8')}"
-                        else:
-                            prof_pic = None
-                        data['prof_photo'] = prof_pic
-                        del prof_pic
+                        )]
                         # Check if user is private/public
                         data['is_private'] = graphql['is_private']
                         if not data['is_private']:
@@ -142,22 +172,13 @@ class api():
                                     post = edges[itr]['node']
                                     if not post['is_video']:
                                         photo_count += 1
-                                        # Download and save photo
-                                        try:
-                                            r = requests.get(
-                                                post['display_url'],
-                                                headers={
-                                                    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.16; rv:82.0) Gecko/20100101 Firefox/82.0'
-                                                }
-                                            )
-                                        except Exception as e:
-                                            print(f'  💔 {e}')
-                                        if r:
-                                            photo = f"data:{r.headers['Content-Type']};base64,{base64.b64encode(r.content).decode('utf-8')}"
-                                        else:
-                                            photo = None
-                                        data[f'photo{photo_count}'] = photo
-                                        del photo
+                                        # Download photo
+                                        downloads.append(self.download(
+                                            post['display_url'],
+                                            headers={
+                                                'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10.16; rv:82.0) Gecko/20100101 Firefox/82.0'
+                                            }
+                                        ))
                                         data[f'photo{photo_count}_comments_disabled'] = post['comments_disabled']
                                         data[f'photo{photo_count}_timestamp'] = post['taken_at_timestamp']
                                         try:
@@ -169,6 +190,13 @@ class api():
                                         except:
                                             data[f'photo{photo_count}_likes'] = None
                                     itr += 1
+                        # Save photos and their original dimensions
+                        photos = await asyncio.gather(*downloads)
+                        for key, (photo, width, height) in zip(['prof_photo', 'photo1', 'photo2', 'photo3'], photos):
+                            data[key] = photo
+                            if width:
+                                data[f'{key}_width'] = width
+                                data[f'{key}_height'] = height
             # Return
             return data
         else:
@@ -1,9 +1,9 @@
 #!/usr/bin/env python
 
-from bs4 import BeautifulSoup
+import lxml.html
 import pandas as pd
-import requests
 import random
+import io
 import re
 
 # Global compiled regex pattern for Wikipedia references
@@ -36,33 +36,38 @@ def remove_wikipedia_refs(raw_data):
                 pass
     return(raw_data)
 
-def scrape(show):
+def show_url(show):
     # Select URL
     if show == 'bachelor':
-        url = 'https://en.wikipedia.org/wiki/The_Bachelor_(American_TV_series)'
+        return 'https://en.wikipedia.org/wiki/The_Bachelor_(American_TV_series)'
     elif show == 'bachelorette':
-        url = 'https://en.wikipedia.org/wiki/The_Bachelorette'
+        return 'https://en.wikipedia.org/wiki/The_Bachelorette'
+
+def parse(show, html):
+    # Parse the returned source with lxml
+    doc = lxml.html.document_fromstring(html)
+    # Parse out Seasons table
+    table = doc.xpath('//table[@class="wikitable plainrowheaders"]')[0]
+    # Convert only the html table's subtree to a dataframe
+    df = pd.read_html(io.StringIO(lxml.html.tostring(table, encoding='unicode', with_tail=False)), header=0)[0]
+    # Rename '#' column to 'Season'
+    df = df.rename(columns={'#': 'Season'})
+    # Add 'Show' column
+    df['Show'] = [show for i in range(len(df.index))]
+    # Convert dataframe to dict
+    raw_data = [record for record in df.to_dict(orient='records')]
+    # Clean Wikipedia references from key-value pairs
+    data = remove_wikipedia_refs(raw_data)
+    return data
+
+async def scrape(fetcher, show):
     # Get url and save DOM
-    dom = requests.get(
-            url,
+    dom = await fetcher.get(
+            show_url(show),
             headers={'User-Agent':select_ua()}
-        ).text
+        )
     # If returned status code is good, continue
     if dom:
-        # Soup-ify the returned source
-        soup = BeautifulSoup(dom.text, 'html.parser')
-        # Parse out Seasons table
-        table = soup.find('table', class_='wikitable plainrowheaders')
-        # Convert html table to dataframe
-        df = pd.read_html(str(table), header=0)[0]
-        # Rename '#' column to 'Season'
-        df = df.rename(columns={'#': 'Season'})
-        # Add 'Show' column
-        df['Show'] = [show for i in range(len(df.index))]
-        # Convert dataframe to dict
-        raw_data = [record for record in df.to_dict(orient='records')]
-        # Clean Wikipedia references from key-value pairs
-        data = remove_wikipedia_refs(raw_data)
-        return data
+        return parse(show, dom.text)
     else:
-        return {}
+        return []
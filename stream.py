@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+'''
+Stream contestants through collection and transformation as a task graph
+    * Each data set 2 season's contestants feed data set 3 profile fetches as soon as the season is scraped
+    * Each data set 3 profile feeds preprocessing of its photo (on a process pool) and the contestant's
+      data set 4 Instagram lookups as soon as it is scraped
+    * A contestant's Instagram profile picture is preprocessed if their headshot can't be
+    * Data set 5 is evaluated with every algorithm once all faces are preprocessed
+Every stage's records are journaled as they finish, so --resume picks up where a run stopped
+'''
+
+from algorithms import batch
+from scheduler import scheduler
+from vision import detectors
+from vision import registry
+from scrapers import *
+import pandas as pd
+import telemetry
+import transform
+import evaluate
+import asyncio
+import collect
+import model
+import bach
+import sys
+import os
+
+# Global var for path to volume within container
+PATH_TO_VOLUME = collect.PATH_TO_VOLUME
+
+class pipeline():
+    def __init__(self, fetcher, ig, sched, resume, working_size=0, detector='cascade'):
+        self.fetcher = fetcher
+        self.working_size = working_size
+        self.detector = detector
+        self.ig = ig
+        self.sched = sched
+        self.bachmodel = model.bachmodel(PATH_TO_VOLUME)
+        # Journal, journaled entries (when resuming), and failed work items of each streamed data set
+        self.journals = {}
+        self.entries = {}
+        self.failed = {}
+        # Data sets whose stage ran (i.e. data set 4 never runs without an Instagram login)
+        self.ran = set()
+        for ds in [2, 3, 4, 5]:
+            self.journals[ds] = model.journal(PATH_TO_VOLUME, ds)
+            if resume:
+                self.entries[ds] = {entry['key']: entry['records'] for entry in self.journals[ds].entries()}
+            else:
+                self.journals[ds].reset()
+                self.entries[ds] = {}
+            self.failed[ds] = []
+
+    async def stage(self, ds, key, make_coro):
+        # Return the records of a work item, from the journal if it already finished, else by running it
+        self.ran.add(ds)
+        if key in self.entries[ds]:
+            return self.entries[ds][key]
+        try:
+            with telemetry.timer(f'ds{ds}'):
+                result = await make_coro()
+        except Exception as e:
+            print(f'  💔 {e}')
+            telemetry.count('items_failed', stage=f'ds{ds}')
+            self.failed[ds].append(key)
+            return None
+        if isinstance(result, list):
+            records = result
+        else:
+            records = [result] if result else []
+        self.journals[ds].append(key, records)
+        return records
+
+    async def season(self, show, season):
+        records = await self.stage(2, f'{show}_{season}', lambda: collect.scrape2(self.fetcher, show, season))
+        # Feed every contestant of the season to the next stage immediately
+        for record in records if records else []:
+            self.sched.spawn(self.contestant(record), record['name'])
+
+    async def contestant(self, record2):
+        id = record2['id']
+        records3 = await self.stage(3, id, lambda: collect.scrape3(self.fetcher, id, record2['profile_url']))
+        if not records3:
+            return
+        record3 = records3[0]
+        # Start the contestant's Instagram lookups while their headshot is preprocessed
+        igs = []
+        if self.ig:
+            for url in record3['social_media']:
+                if 'instagram' in url.lower():
+                    igs.append(self.sched.spawn(self.stage(4, f'{id}_{url}', lambda url=url: collect.compile4(self.ig, id, url)), url))
+        await self.stage(5, id, lambda: self.face(id, record3['name'], record3['photo'], igs))
+
+    async def face(self, id, name, photo, igs):
+        # Preprocess the headshot from data set 3
+        id, record = await self.sched.cpu(transform.process_face, id, name, photo, self.working_size, self.detector)
+        if len(record) > 0:
+            return record
+        # Otherwise, fall back to Instagram profile pictures from data set 4
+        for ig in igs:
+            records4 = await ig
+            if records4 and records4[0]['prof_photo']:
+                id, record = await self.sched.cpu(transform.process_face, id, name, records4[0]['prof_photo'], self.working_size, self.detector)
+                if len(record) > 0:
+                    return record
+        return None
+
+    async def run(self, seasons):
+        for show, season in seasons:
+            self.sched.spawn(self.season(show, season), f'{show}_{season}')
+        await self.sched.drain()
+
+    def compact(self):
+        # Compact the journal of every stage that ran into its data set file and evaluate data set 5
+        # (data sets whose stage never ran are left alone rather than overwritten with an empty one)
+        dfs = {}
+        for ds in [2, 3, 4, 5]:
+            self.journals[ds].close()
+            if ds in self.ran:
+                dfs[ds] = collect.compact(self.bachmodel, self.journals[ds], ds, self.failed[ds])
+        if 5 in dfs and not dfs[5].empty:
+            print('🌹 Evaluating data set 5')
+            # Reuse the cached results of faces evaluated by an earlier run
+            cache = model.result_cache(os.path.join(PATH_TO_VOLUME, 'results.sqlite3'))
+            results, timings = evaluate.evaluate_faces(dfs[5], batch.ALGORITHMS.keys(), cache=cache)
+            for algorithm, seconds in timings.items():
+                print(f'  ⏱️  {algorithm}: {seconds:.4f}s')
+            cache.report()
+            cache.close()
+            self.bachmodel.save_df(evaluate.merge_results(dfs[5], results), 5)
+
+'''
+Main
+'''
+def main(args=None):
+    # Retrieve args (see bach.py)
+    if args is None:
+        args = bach.parse_args(['stream', *sys.argv[1:]])
+
+    # Report per-stage metrics to the volume while streaming
+    metrics = telemetry.reporter(PATH_TO_VOLUME).start()
+
+    # Initialize data model handler object and the fetch engine shared by all scrapers
+    bachmodel = model.bachmodel(PATH_TO_VOLUME)
+    fetcher = fetch.engine(rate=args.rate, concurrency=args.concurrency, cachedir=os.path.join(PATH_TO_VOLUME, 'http_cache'), offline=args.offline, max_edge=args.max_edge, jpeg_quality=args.jpeg_quality, retries=args.retries)
+
+    # Data set 1 is small and determines which seasons exist
+    print('🌹 Collecting data set 1')
+    df1 = pd.DataFrame(asyncio.run(collect.scrape1(fetcher)))
+    bachmodel.save_df(df1, 1)
+    seasons = []
+    for show in [0,1]:
+        if len(args.season) > 0:
+            seasons += [(show, season) for season in args.season]
+        elif not df1.empty:
+            max_season = int(df1[df1['show']==show]['season'].max())
+            seasons += [(show, season) for season in range(1, max_season+1)]
+
+    # Load the pre-trained models once in the parent so that forked workers share them
+    print('🌹 Loading pre-trained models')
+    models = ['predictor', *detectors.BACKENDS[args.detector].models]
+    registry.load_all(names=models)
+    sched = scheduler(cpu_workers=args.workers, initializer=registry.init_worker, initargs=(models,), timeout=args.timeout, retries=args.retries, max_tasks_per_child=args.max_tasks_per_child)
+    ig = instagram.api(os.path.join(PATH_TO_VOLUME, 'ig.cfg'), fetcher) if args.instagram else None
+
+    print(f'🌹 Streaming {len(seasons)} seasons through data sets 2-5')
+    stream = pipeline(fetcher, ig, sched, args.resume, args.working_size, args.detector)
+    asyncio.run(stream.run(seasons))
+    stream.compact()
+
+    sched.close()
+    fetcher.close()
+    metrics.stop()
+
+if __name__ == '__main__':
+    main()
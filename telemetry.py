@@ -0,0 +1,214 @@
+#!/usr/bin/env python
+
+'''
+Per-stage telemetry for collection and transformation
+    * Timers record the latency of each item processed by a stage (wall time, items/sec, p50/p95/p99)
+    * Counters record events such as HTTP status codes, bytes downloaded, and faces rejected at each gate
+    * Every process (including pool workers) keeps its own metrics and periodically snapshots them to
+      metrics/<host>.<run>.<pid>.json in the volume (run being the pid of the process that started the run),
+      so containers sharing the volume keep separate snapshots; a reporter thread in the parent merges the snapshots into
+      metrics.json and metrics.prom (Prometheus text format) while the run is in progress
+'''
+
+import contextlib
+import threading
+import socket
+import json
+import time
+import os
+
+# Directory holding each process's metric snapshots and the run they belong to (set by start() and inherited by forked workers)
+_dir = None
+_run = None
+# This process's metrics: stage latencies (with first start/last end times) and labeled counters
+_pid = None
+_timers = {}
+_counters = {}
+_last_flush = 0
+_lock = threading.Lock()
+
+def _own():
+    # Forked workers inherit the parent's metrics; start from scratch in every new process
+    global _pid, _timers, _counters, _last_flush
+    if _pid != os.getpid():
+        _pid = os.getpid()
+        _timers = {}
+        _counters = {}
+        _last_flush = 0
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def start(localdir):
+    # Begin a run: clear this host's snapshots from previous runs (other hosts' and live runs' snapshots are left alone)
+    global _dir, _run
+    _dir = os.path.join(localdir, 'metrics')
+    _run = f'{socket.gethostname()}.{os.getpid()}'
+    os.makedirs(_dir, exist_ok=True)
+    host = f'{socket.gethostname()}.'
+    for name in os.listdir(_dir):
+        parts = name[len(host):].split('.')
+        if not name.startswith(host) or len(parts) < 3 or not parts[0].isdigit() or not parts[1].isdigit():
+            continue
+        if int(parts[0]) == os.getpid() or not _alive(int(parts[0])):
+            os.remove(os.path.join(_dir, name))
+
+def observe(stage, seconds, items=1):
+    # Record that a stage processed items in the given number of seconds
+    with _lock:
+        _own()
+        now = time.time()
+        timer = _timers.setdefault(stage, {'latencies': [], 'items': 0, 'first': now - seconds, 'last': now})
+        timer['latencies'].append(seconds)
+        timer['items'] += items
+        timer['first'] = min(timer['first'], now - seconds)
+        timer['last'] = max(timer['last'], now)
+    flush()
+
+@contextlib.contextmanager
+def timer(stage, items=1):
+    # Time a block of code as one item (or batch of items) processed by a stage
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - start, items)
+
+def count(name, value=1, **labels):
+    # Increment a counter identified by its name and labels
+    key = json.dumps([name, labels], sort_keys=True)
+    with _lock:
+        _own()
+        _counters[key] = _counters.get(key, 0) + value
+    flush()
+
+def flush(force=False):
+    # Snapshot this process's metrics to the volume (at most once a second unless forced)
+    global _last_flush
+    if not _dir:
+        return
+    with _lock:
+        _own()
+        now = time.time()
+        if not force and now - _last_flush < 1:
+            return
+        _last_flush = now
+        snapshot = json.dumps({'timers': _timers, 'counters': _counters})
+    path = os.path.join(_dir, f'{_run}.{os.getpid()}.json')
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(snapshot)
+    os.replace(tmp_path, path)
+
+def percentile(values, q):
+    # Nearest-rank percentile of a sorted list
+    if len(values) == 0:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(q / 100 * len(values))) - 1))]
+
+def aggregate():
+    # Merge every process's snapshot into per-stage summaries and counter totals
+    timers = {}
+    counters = {}
+    for name in os.listdir(_dir) if _dir else []:
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(_dir, name), 'r') as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for stage, timer in snapshot['timers'].items():
+            merged = timers.setdefault(stage, {'latencies': [], 'items': 0, 'first': timer['first'], 'last': timer['last']})
+            merged['latencies'] += timer['latencies']
+            merged['items'] += timer['items']
+            merged['first'] = min(merged['first'], timer['first'])
+            merged['last'] = max(merged['last'], timer['last'])
+        for key, value in snapshot['counters'].items():
+            counters[key] = counters.get(key, 0) + value
+    stages = {}
+    for stage, timer in timers.items():
+        latencies = sorted(timer['latencies'])
+        wall = timer['last'] - timer['first']
+        stages[stage] = {
+            'items': timer['items'],
+            'wall_seconds': wall,
+            'busy_seconds': sum(latencies),
+            'items_per_second': timer['items'] / wall if wall > 0 else 0.0,
+            'p50_seconds': percentile(latencies, 50),
+            'p95_seconds': percentile(latencies, 95),
+            'p99_seconds': percentile(latencies, 99)
+        }
+    events = []
+    for key, value in sorted(counters.items()):
+        name, labels = json.loads(key)
+        events.append({'name': name, 'labels': labels, 'value': value})
+    return {'updated': time.time(), 'stages': stages, 'counters': events}
+
+def prometheus(metrics):
+    # Render aggregated metrics in the Prometheus text exposition format
+    lines = ['# TYPE bach_stage_seconds summary']
+    for stage, summary in sorted(metrics['stages'].items()):
+        for q in [50, 95, 99]:
+            lines.append(f'''bach_stage_seconds{{stage="{stage}",quantile="{q/100}"}} {summary[f'p{q}_seconds']}''')
+        lines.append(f'''bach_stage_seconds_sum{{stage="{stage}"}} {summary['busy_seconds']}''')
+        lines.append(f'''bach_stage_seconds_count{{stage="{stage}"}} {summary['items']}''')
+    lines.append('# TYPE bach_stage_items_per_second gauge')
+    for stage, summary in sorted(metrics['stages'].items()):
+        lines.append(f'''bach_stage_items_per_second{{stage="{stage}"}} {summary['items_per_second']}''')
+    names = sorted(set(event['name'] for event in metrics['counters']))
+    for name in names:
+        lines.append(f'# TYPE bach_{name}_total counter')
+        for event in metrics['counters']:
+            if event['name'] == name:
+                labels = ','.join(f'{key}="{value}"' for key, value in sorted(event['labels'].items()))
+                lines.append(f'bach_{name}_total{{{labels}}} {event["value"]}')
+    return '\n'.join(lines) + '\n'
+
+def write(localdir):
+    # Write the aggregated metrics of the run to metrics.json and metrics.prom
+    flush(force=True)
+    metrics = aggregate()
+    for name, content in [('metrics.json', json.dumps(metrics, indent=2)), ('metrics.prom', prometheus(metrics))]:
+        path = os.path.join(localdir, name)
+        tmp_path = f'{path}.{socket.gethostname()}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    return metrics
+
+def summarize(metrics):
+    # Print a summary of each stage of aggregated metrics
+    for stage, summary in sorted(metrics['stages'].items()):
+        print(f'''  📈 {stage}: {summary['items']} items in {summary['wall_seconds']:.2f}s ({summary['items_per_second']:.2f}/s, p50 {summary['p50_seconds']*1000:.0f} ms, p95 {summary['p95_seconds']*1000:.0f} ms, p99 {summary['p99_seconds']*1000:.0f} ms)''')
+
+class reporter():
+    # Background thread in the parent process that rewrites the metrics files during a run
+    def __init__(self, localdir, interval=10):
+        self.localdir = localdir
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            write(self.localdir)
+
+    def start(self):
+        start(self.localdir)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        # Write the final metrics and print a summary of each stage
+        self.stopped.set()
+        self.thread.join()
+        metrics = write(self.localdir)
+        summarize(metrics)
+        return metrics
@@ -10,17 +10,23 @@ Create a new dataset by
 	3. Aggregate relevant data points from all data sets
 '''
 
-from multiprocessing import Pool
+from evaluate import evaluate_faces, merge_results, evaluate_all
+from multiprocessing import Process, Pool
 from algorithms import *
+from scheduler import imap_unordered, deadline, backoff, DEADLINE_GRACE
+from vision import detectors
+from vision import registry
 import pandas as pd
 import numpy as np
-import argparse
-import base64
+import telemetry
 import model
+import bach
 import dlib
 import math
 import json
+import time
 import cv2
+import sys
 import os
 
 # Global var for path to volume within container
@@ -28,173 +34,199 @@ PATH_TO_VOLUME = os.path.join(os.getcwd(), 'data')
 if not os.path.exists(PATH_TO_VOLUME):
     os.mkdir(PATH_TO_VOLUME)
 
+# bach.py lists the detector backends without importing OpenCV, so fail loudly if its list drifts from the backends
+if sorted(bach.DETECTORS) != sorted(detectors.BACKENDS):
+	raise RuntimeError(f'bach.DETECTORS {bach.DETECTORS} does not match vision.detectors.BACKENDS {list(detectors.BACKENDS)}')
+
 '''
 Helper functions
 '''
-def b64_to_img(uri):
-	encoded_data = uri.split(',')[1]
-	nparr = np.frombuffer(base64.b64decode(encoded_data), np.uint8)
+def blob_to_img(blobs, key):
+	# Decode an image straight from the blob store's memory-mapped bytes
+	nparr = np.frombuffer(blobs.get(key), np.uint8)
 	img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
 	return img
 
+def downsample(img, working_size):
+	# Shrink an image so that its longest edge is at most working_size pixels (0 keeps full resolution)
+	# Returns the image and its scale relative to the original
+	h, w = img.shape[:2]
+	if not working_size or max(h, w) <= working_size:
+		return img, 1.0
+	scale = working_size / max(h, w)
+	img_small = cv2.resize(img, (max(1, round(w * scale)), max(1, round(h * scale))), interpolation=cv2.INTER_AREA)
+	return img_small, scale
+
 def euclidean_distance(a, b):
 	x1 = a[0]; y1 = a[1]
 	x2 = b[0]; y2 = b[1]
 	return math.sqrt(((x2 - x1) * (x2 - x1)) + ((y2 - y1) * (y2 - y1)))
 
-def rotate_img(img, angle):
+def rotation_matrix(img, angle):
+	# Affine matrix rotating an image about its center
 	img_center = tuple(np.array(img.shape[1::-1]) / 2)
-	rot_mat = cv2.getRotationMatrix2D(img_center, angle, 1.0)
+	return cv2.getRotationMatrix2D(img_center, angle, 1.0)
+
+def rotate_img(img, angle):
+	rot_mat = rotation_matrix(img, angle)
 	result = cv2.warpAffine(img, rot_mat, img.shape[1::-1], flags=cv2.INTER_LINEAR)
 	return result
 
+def transform_points(points, matrix):
+	# Apply a 2 x 3 affine matrix to an (N, 2) array of points
+	points = np.asarray(points, dtype=np.float64)
+	return points @ matrix[:, :2].T + matrix[:, 2]
+
+def plausible_landmarks(landmarks, w, h, margin=0.1):
+	# Sanity check landmarks carried through a transform: within the image (give or take a margin) and upright (chin below the nose bridge)
+	landmarks = np.asarray(landmarks)
+	inside = np.all(landmarks >= [-margin * w, -margin * h]) and np.all(landmarks <= [(1 + margin) * w, (1 + margin) * h])
+	return bool(inside and landmarks[8, 1] > landmarks[27, 1])
+
 def detect_landmarks(x, y, w, h, img):
-	# Read-in dlib shape predictor from http://dlib.net/files/shape_predictor_68_face_landmarks.dat.bz2
-	predictor = dlib.shape_predictor('/usr/bin/shape_predictor_68_face_landmarks.dat')
+	# Retrieve the process-wide dlib shape predictor
+	predictor = registry.get('predictor')
 	# Convert the cv2 rectangle coordinates to Dlib rectangle
-	dlib_rect = dlib.rectangle(x, y, x+w, y+h)
+	dlib_rect = dlib.rectangle(int(x), int(y), int(x+w), int(y+h))
 	# Detect landmarks
-	detected_landmarks = predictor(img, dlib_rect).parts()
+	with telemetry.timer('landmarks'):
+		detected_landmarks = predictor(img, dlib_rect).parts()
 	# Convert landmarks to np matrix (containes indices of landmarks)
 	landmarks = np.matrix([[p.x,p.y] for p in detected_landmarks])
 	return landmarks
 
 '''
 Rotate a contestant's photo so that their face is straight
+Faces are found by the given detector backend (see vision.detectors)
+Returns the index of the verified face, the angle to rotate, the face's rectangle, and its landmarks
 Guidance from: https://sefiks.com/2020/02/23/face-alignment-for-face-recognition-in-python-within-opencv/
 '''
-def get_face_rotation(img):
-	# Load pre-trained classifiers
-	face_cascade = cv2.CascadeClassifier(f'{cv2.data.haarcascades}haarcascade_frontalface_default.xml')
-	mouth_cascade = cv2.CascadeClassifier(f'{cv2.data.haarcascades}haarcascade_mcs_mouth.xml')
-	eye_cascade = cv2.CascadeClassifier(f'{cv2.data.haarcascades}haarcascade_eye.xml')
-
-	# Convert to grayscale
-	img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-	# Apply a Gaussian blur with a 3 x 3 kernel to help remove high frequency noise
-	img_gauss = cv2.GaussianBlur(img_gray,(3,3), 0)
-
-	# Detect contestant's face
-	# https://stackoverflow.com/questions/20801015/recommended-values-for-opencv-detectmultiscale-parameters
-	faces = face_cascade.detectMultiScale(img_gauss, scaleFactor=1.05, minNeighbors=6, minSize=(20,20), flags=cv2.CASCADE_SCALE_IMAGE)
-	face_index = 0
-	for face in faces:
+def get_face_rotation(img, detector):
+	# Detect contestant's face, trying each face the detector finds until one is verified
+	for face_index, (face, verified) in enumerate(detector.faces(img)):
 		(x, y, w, h) = face
-		# Get face image
-		face_img = img_gauss[y:y+h, x:x+w]
-		# Detect a mouth
-		mouth = mouth_cascade.detectMultiScale(face_img, scaleFactor=1.05, minNeighbors=6)
-		if len(mouth) > 0:
-			# Detect eyes JUST for second check that detected face is truly a face
-			eyes = eye_cascade.detectMultiScale(face_img, scaleFactor=1.05, minNeighbors=1)
-			# Ensure that at least one eye was detected
-			if len(eyes) > 0:
-				# Detect landmarks -- NOTE: it seems as if all landmarks are truly at point landmark-1
-				landmarks = detect_landmarks(x, y, w, h,img)
-				# Get the center point of (midpoint between) each eye
-				# Get top left and bottom right points of right eye
-				if landmarks[37, 1] > landmarks[38, 1]:
-					y = landmarks[38, 1]
-				else:
-					y = landmarks[37, 1]
-				right_top_left = (landmarks[36,0], y)
-				if landmarks[41, 1] > landmarks[40, 1]:
-					y = landmarks[41, 1]
-				else:
-					y = landmarks[40, 1]
-				right_bottom_right = (landmarks[39,0], y)
-				# Get top left and bottom right points of left eye
-				if landmarks[43, 1] > landmarks[44,1]:
-					y = landmarks[44,1]
-				else:
-					y = landmarks[43,1]
-				left_top_left = (landmarks[42,0], y)
-				if landmarks[47, 1] > landmarks[46, 1]:
-					y = landmarks[47, 1]
-				else:
-					y = landmarks[46, 1]
-				left_bottom_right = (landmarks[45,0], y)
-				# Get the center points of each eye (midpoint formula)
-				right_x = (right_top_left[0] + right_bottom_right[0])//2
-				right_y = (right_top_left[1] + right_bottom_right[1])//2
-				right_center = (right_x, right_y)
-				left_x = (left_top_left[0] + left_bottom_right[0])//2
-				left_y = (left_top_left[1] + left_bottom_right[1])//2
-				left_center = (left_x, left_y)
-
-				# Evaluate the location of the horizontal point and direction of rotation (clockwise or counterclockwise)
-				if left_y < right_y:
-					horiz_point = (right_x, left_y)
-					direction = -1 # clockwise
-				else:
-					horiz_point = (left_x, right_y)
-					direction = 1 # counterclockwise
+		if verified:
+			# Detect landmarks -- NOTE: it seems as if all landmarks are truly at point landmark-1
+			landmarks = detect_landmarks(x, y, w, h,img)
+			# Get the center point of (midpoint between) each eye
+			# Get top left and bottom right points of right eye
+			if landmarks[37, 1] > landmarks[38, 1]:
+				y = landmarks[38, 1]
+			else:
+				y = landmarks[37, 1]
+			right_top_left = (landmarks[36,0], y)
+			if landmarks[41, 1] > landmarks[40, 1]:
+				y = landmarks[41, 1]
+			else:
+				y = landmarks[40, 1]
+			right_bottom_right = (landmarks[39,0], y)
+			# Get top left and bottom right points of left eye
+			if landmarks[43, 1] > landmarks[44,1]:
+				y = landmarks[44,1]
+			else:
+				y = landmarks[43,1]
+			left_top_left = (landmarks[42,0], y)
+			if landmarks[47, 1] > landmarks[46, 1]:
+				y = landmarks[47, 1]
+			else:
+				y = landmarks[46, 1]
+			left_bottom_right = (landmarks[45,0], y)
+			# Get the center points of each eye (midpoint formula)
+			right_x = (right_top_left[0] + right_bottom_right[0])//2
+			right_y = (right_top_left[1] + right_bottom_right[1])//2
+			right_center = (right_x, right_y)
+			left_x = (left_top_left[0] + left_bottom_right[0])//2
+			left_y = (left_top_left[1] + left_bottom_right[1])//2
+			left_center = (left_x, left_y)
+
+			# Evaluate the location of the horizontal point and direction of rotation (clockwise or counterclockwise)
+			if left_y < right_y:
+				horiz_point = (right_x, left_y)
+				direction = -1 # clockwise
+			else:
+				horiz_point = (left_x, right_y)
+				direction = 1 # counterclockwise
 
-				# Evaluate the edge lengths of the triangle made up of the line between the center of the eyes, a perfectly horizontal line, and a perfectly vertical line (with euclidean distance)
-				a = euclidean_distance(left_center, horiz_point)
-				b = euclidean_distance(right_center, left_center)
-				c = euclidean_distance(right_center, horiz_point)
+			# Evaluate the edge lengths of the triangle made up of the line between the center of the eyes, a perfectly horizontal line, and a perfectly vertical line (with euclidean distance)
+			a = euclidean_distance(left_center, horiz_point)
+			b = euclidean_distance(right_center, left_center)
+			c = euclidean_distance(right_center, horiz_point)
 
-				# Find the possible angle of rotation with arc cosine (inverse)
-				if b > 0 and c > 0: # Ensure no division by 0
-					arc_cos = (b*b + c*c - a*a)/(2*b*c)
-				else:
-					arc_cos = 0
-				angle = np.arccos(arc_cos)
-				# Convert angle from radians to degrees
-				angle = (angle * 180) / math.pi
+			# Find the possible angle of rotation with arc cosine (inverse)
+			if b > 0 and c > 0: # Ensure no division by 0
+				arc_cos = (b*b + c*c - a*a)/(2*b*c)
+			else:
+				arc_cos = 0
+			angle = np.arccos(arc_cos)
+			# Convert angle from radians to degrees
+			angle = (angle * 180) / math.pi
 
-				# If rotating clockwise, evaluate angle by negative evaluation of 90-angle (sum of all angles of a triangle = 180, we've already created a right 90 degree angle between the horizontal/vertical lines and line between center of the eyes)
-				if direction == -1:
-					angle = 0-(90 - angle)
+			# If rotating clockwise, evaluate angle by negative evaluation of 90-angle (sum of all angles of a triangle = 180, we've already created a right 90 degree angle between the horizontal/vertical lines and line between center of the eyes)
+			if direction == -1:
+				angle = 0-(90 - angle)
 
-				# Return the angle to rotate
-				return face_index, angle
-		face_index += 1
-	return None, None
+			# Return the face, its landmarks, and the angle to rotate
+			return face_index, angle, face, landmarks
+	return None, None, None, None
 
 '''
 Crop a contestant's photo to just their face
+Faces and landmarks are found on a copy downsampled to working_size (if given) and mapped back to
+full resolution only for the final crop
+Landmarks are detected once and carried through the rotation, crop, and resize transforms
 '''
-def process_face(id, name, b64photo):
+def process_face(id, name, photo, working_size=0, detector='cascade'):
 	# Initialize data model handler object
 	bachmodel = model.bachmodel(PATH_TO_VOLUME)
 
-	# Load pre-trained classifier
-	face_cascade = cv2.CascadeClassifier(f'{cv2.data.haarcascades}haarcascade_frontalface_default.xml')
-
-	# Extract image extension
-	ext = f'''.{b64photo.split(';base64')[0].split('/')[-1]}'''
-	# Convert base64 encoded photo to a cv2 image
-	img = b64_to_img(b64photo)
+	# Initialize the face detector backend
+	face_detector = detectors.get(detector)
+
+	# Skip contestants without a photo
+	if not photo:
+		telemetry.count('faces_rejected', gate='photo')
+		return id, {}
+	with telemetry.timer('process_face'):
+		record = preprocess_face(bachmodel, face_detector, id, name, photo, working_size)
+	# Snapshot this worker's metrics after every task
+	telemetry.flush(force=True)
+	# Return the record
+	return id, record
 
-	# Find detected face index and rotation angle for image
-	face_index, rotation_angle = get_face_rotation(img)
+# Rotate, crop, and landmark one photo, returning the modeled record (empty if any gate rejects the photo)
+def preprocess_face(bachmodel, face_detector, id, name, photo, working_size=0):
+	# Convert the stored photo (blob key) to a cv2 image
+	img = blob_to_img(bachmodel.blobs, photo)
+	# Detect at the working resolution
+	img_small, scale = downsample(img, working_size)
+
+	# Find the verified face, its landmarks, and the rotation angle for image (the angle doesn't depend on resolution)
+	face_index, rotation_angle, face, landmarks = get_face_rotation(img_small, face_detector)
+	# If no face passed the mouth and eye checks, detect the face again without rotating
+	if rotation_angle is None:
+		rotation_angle = 0
+		landmarks = None
 	# Rotate image
-	img_straight = rotate_img(img, rotation_angle)
-
-	# Many thanks to https://github.com/rajendra7406-zz/FaceShape -->
-	# Make a copy of the original (straightened) image
-	img_original = img_straight.copy()
-	# Convert to grayscale
-	img_gray = cv2.cvtColor(img_straight, cv2.COLOR_BGR2GRAY)
-	# Apply a Gaussian blur with a 3 x 3 kernel to help remove high frequency noise
-	img_gauss = cv2.GaussianBlur(img_gray,(3,3), 0)
-
-	# Detect contestant's face
-	# https://stackoverflow.com/questions/20801015/recommended-values-for-opencv-detectmultiscale-parameters
-	faces = face_cascade.detectMultiScale(img_gauss, scaleFactor=1.05, minNeighbors=6, minSize=(20,20), flags=cv2.CASCADE_SCALE_IMAGE)
-	if len(faces) > 0:
-		# Handle the case that a face is not detected this time around or face_index is null
-		if not face_index or len(faces) <= face_index:
-			face_index = 0
-
-		# Use face at face_index (from rotation angle evaluation)
-		(x, y, w, h) = faces[face_index]
-
-		# Detect landmarks
-		landmarks = detect_landmarks(x, y, w, h, img_straight)
+	with telemetry.timer('rotation'):
+		img_straight = rotate_img(img, rotation_angle)
 
+	# Carry the face and its landmarks through the rotation (at full resolution) instead of detecting them again
+	if landmarks is not None:
+		rot_mat = rotation_matrix(img, rotation_angle)
+		landmarks = transform_points(np.asarray(landmarks) / scale, rot_mat)
+		(x, y, w, h) = face
+		face_center = transform_points([[(x + w / 2) / scale, (y + h / 2) / scale]], rot_mat)[0]
+		y = face_center[1] - h / scale / 2
+		if not plausible_landmarks(landmarks, img.shape[1], img.shape[0]):
+			telemetry.count('landmarks_redetected', stage='rotation')
+			landmarks = None
+	if landmarks is None:
+		y, landmarks = redetect_face(face_detector, img_straight, face_index, working_size)
+
+	if landmarks is not None:
+		# Many thanks to https://github.com/rajendra7406-zz/FaceShape -->
+		landmarks = np.rint(landmarks).astype(int)
+		y = int(round(y))
 		# Save left and right cheek points
 		cheek_left = (landmarks[1,0],landmarks[1,1])
 		cheek_right = (landmarks[15,0],landmarks[15,1])
@@ -204,91 +236,367 @@ def process_face(id, name, b64photo):
 		# Save top (of forehead) and bottom (of chin) face points
 		face_bottom = (landmarks[8,0],landmarks[8,1])
 		face_top = (landmarks[8,0],y)
-		# Find top right and bottom left points of rectangle around face
+		# Find top right and bottom left points of rectangle around face (within the photo)
 		if cheek_left[0] < jaw_left[0]:
-			top_left = (cheek_left[0], face_top[1])
+			top_left = (max(0, cheek_left[0]), max(0, face_top[1]))
 		else:
-			top_left = (jaw_left[0], face_top[1])
+			top_left = (max(0, jaw_left[0]), max(0, face_top[1]))
 		if cheek_right[0] > cheek_right[0]:
 			bottom_right = (cheek_right[0], face_bottom[1])
 		else:
 			bottom_right = (jaw_right[0], face_bottom[1])
 
 		# Crop photo to just contestant's face
-		img_cropped = img_original[top_left[1]:bottom_right[1], top_left[0]:bottom_right[0]]
-
-		# Resize image to height == 150 (for standardization)
-		resize_height = 150
-		# Calculate the ratio of the height and construct the dimensions
-		h, w, c = img_cropped.shape
-		ratio = resize_height / h
-		dimensions = (int(w * ratio), resize_height)
-		try:
-			img_resized = cv2.resize(img_cropped, dimensions, interpolation=cv2.INTER_AREA)
-		except Exception as e:
-			print(f'  💔 {e}')
-			img_resized = np.array([])
+		with telemetry.timer('cropping'):
+			img_cropped = img_straight[top_left[1]:bottom_right[1], top_left[0]:bottom_right[0]]
+
+			# Resize image to height == 150 (for standardization)
+			resize_height = 150
+			# Calculate the ratio of the height and construct the dimensions
+			h, w, c = img_cropped.shape
+			ratio = resize_height / h if h > 0 else 0
+			dimensions = (int(w * ratio), resize_height)
+			try:
+				img_resized = cv2.resize(img_cropped, dimensions, interpolation=cv2.INTER_AREA)
+			except Exception as e:
+				print(f'  💔 {e}')
+				img_resized = np.array([])
 
 		if img_resized.size > 0:
-			# Encode resized, cropped image as base64 string
-			b64face = f'''data:image/jpeg;base64,{base64.b64encode(cv2.imencode(ext, img_resized)[1]).decode()}'''
+			# Encode resized, cropped image as a jpeg and store it in the blob store
+			face_key = bachmodel.blobs.put(cv2.imencode('.jpg', img_resized)[1].tobytes())
 
-			# Lastly, detect new landmarks
-			h, w, c = img_resized.shape
-			landmarks = detect_landmarks(0, 0, w, h, img_resized).tolist()
+			# Lastly, carry the landmarks through the crop and resize (detecting them again only if they don't fit the face)
+			resized_h, resized_w, c = img_resized.shape
+			landmarks = (landmarks - top_left) * [resized_w / w, resized_h / h]
+			if not plausible_landmarks(landmarks, resized_w, resized_h):
+				telemetry.count('landmarks_redetected', stage='crop')
+				landmarks = detect_landmarks(0, 0, resized_w, resized_h, img_resized)
+			h, w = resized_h, resized_w
 
 			# Model the data
 			record = {
 				'id': str(id),
 				'name': name,
-				'dlib_landmarks': landmarks,
-				'face_photo': b64face,
+				'dlib_landmarks': np.rint(landmarks).astype(int).tolist(),
+				'face_photo': face_key,
 				'face_height': h,
 				'face_width': w
 			}
 		else:
+			telemetry.count('faces_rejected', gate='crop')
 			record = {}
 	else:
+		telemetry.count('faces_rejected', gate='face')
 		record = {}
 	if len(record) > 0:
 		# Model the record
 		record = bachmodel.model_one(5, record)
-	# Return the record
-	return id, record
+	return record
+
+# Detect the face and its landmarks on the straightened photo (when they can't be carried through the rotation)
+# Returns the top of the face and its landmarks at full resolution, or None, None if no face is found
+def redetect_face(face_detector, img_straight, face_index, working_size=0):
+	img_small, scale = downsample(img_straight, working_size)
+	# Detect contestant's face (without verifying it again)
+	faces = [face for face, verified in face_detector.faces(img_small, verify=False)]
+	if len(faces) == 0:
+		return None, None
+	# Handle the case that a face is not detected this time around or face_index is null
+	if not face_index or len(faces) <= face_index:
+		face_index = 0
+	# Use face at face_index (from rotation angle evaluation)
+	(x, y, w, h) = faces[face_index]
+	# Detect landmarks and map them back to full resolution
+	landmarks = detect_landmarks(x, y, w, h, img_small)
+	return y / scale, np.asarray(landmarks) / scale
+
+'''
+Pool workers receive only contestant ids: each worker opens the names and photo blob keys of data
+sets 3 and 4 read-only (inheriting them from the parent where possible) and reads pixels from the
+memory-mapped blob store
+'''
+# Preprocessing settings and opened data sets of this process (set by init_worker)
+WORKER = {'sources': {}}
+
+# Column holding the photo to preprocess in each data set
+PHOTO_COLUMNS = {3: 'photo', 4: 'prof_photo'}
+
+# Version of the preprocessing pipeline's results (bump whenever preprocess_face changes them, invalidating cached records)
+PIPELINE_VERSION = 1
+
+def configure(working_size, detector):
+	# Set this process's preprocessing settings
+	WORKER['working_size'] = working_size
+	WORKER['detector'] = detector
+
+def init_worker(models, working_size, detector):
+	# Pool initializer: load the models and data set 3 (no-ops for anything inherited from the parent process)
+	registry.init_worker(models)
+	configure(working_size, detector)
+	photo_source(3)
+
+class lazy_pool():
+	# Multiprocessing pool that's only started (after loading the models in the parent, so that forked workers share
+	# them) once a photo has to be preprocessed, with no more processes than photos (i.e. one for a single contestant)
+	def __init__(self, workers, working_size, detector, max_tasks_per_child=0):
+		self.workers = workers
+		self.models = ['predictor', *detectors.BACKENDS[detector].models]
+		self.initargs = (self.models, working_size, detector)
+		self.max_tasks_per_child = max_tasks_per_child if max_tasks_per_child > 0 else None
+		self.pool = None
+
+	def get(self, tasks):
+		if self.pool is None:
+			print('🌹 Loading pre-trained models')
+			registry.load_all(names=self.models)
+			init_worker(*self.initargs)
+			# Workers load any models and data sets not inherited from the parent
+			self.pool = Pool(processes=max(1, min(self.workers, tasks)), initializer=init_worker, initargs=self.initargs, maxtasksperchild=self.max_tasks_per_child)
+		return self.pool
+
+	def close(self):
+		# Called once every result has been consumed or written off as lost; a lost chunk (whose worker hung past its
+		# deadline or crashed) stays pending in the pool forever, so Pool.close() and join() would never return
+		if self.pool is not None:
+			self.pool.terminate()
+			self.pool.join()
+			self.pool = None
+
+def photo_source(ds):
+	# Names and photo blob keys of a data set's contestants, keyed by id (read once per process)
+	if ds not in WORKER['sources']:
+		df = model.bachmodel(PATH_TO_VOLUME).retrieve_df(ds, columns=['id', 'name', PHOTO_COLUMNS[ds]])
+		WORKER['sources'][ds] = {} if df.empty else dict(zip(df['id'], zip(df['name'], df[PHOTO_COLUMNS[ds]])))
+	return WORKER['sources'][ds]
+
+def process_id(id, ds):
+	# Preprocess the photo of the contestant with the given id in data set 3 (headshot) or 4 (Instagram profile picture)
+	name, photo = photo_source(ds).get(id, ('', ''))
+	return process_face(id, name, photo, WORKER['working_size'], WORKER['detector'])
+
+def preprocess_key(id, ds):
+	# Cache key of a contestant's preprocessed record: their photo's blob key (a hash of its bytes), the
+	# preprocessing settings, and the versions of the models used (None if they have no photo)
+	name, photo = photo_source(ds).get(id, ('', ''))
+	if not photo:
+		return None
+	models = ['predictor', *detectors.BACKENDS[WORKER['detector']].models]
+	return model.digest(photo, PIPELINE_VERSION, WORKER['detector'], WORKER['working_size'], {name: registry.version(name) for name in models})
+
+def cached_record(cache, id, ds):
+	# Returns (True, record) if the contestant's photo has been preprocessed with the same models and settings
+	# before (the record is empty if no face was found), otherwise (False, None)
+	key = preprocess_key(id, ds)
+	if cache is None or key is None:
+		return False, None
+	hit, record = cache.get('preprocess', key)
+	if hit and len(record) > 0:
+		record.update(id=id, name=photo_source(ds)[id][0])
+	return hit, record
 
-def eval_rule_of_thirds(id, name, face, dlib_landmarks):
-	# Evaluate rule of thirds
-	results = rule_of_thirds.evaluate(b64_to_img(face), np.array(dlib_landmarks))
-	# Return
-	return id, results
-
-def eval_rule_of_fifths(id, name, face, dlib_landmarks):
-	# Evaluate rule of thirds
-	results = rule_of_fifths.evaluate(b64_to_img(face), np.array(dlib_landmarks))
-	# Return
-	return id, results
-
-def eval_golden_ratio(id, name, face, dlib_landmarks):
-	# Evaluate rule of thirds
-	results = golden_ratio.evaluate(b64_to_img(face), np.array(dlib_landmarks))
-	# Return
-	return id, results
-
-def main():
-	# Retrieve args
-	parser = argparse.ArgumentParser(description='Process contestant data')
-	parser.add_argument('--preprocess', dest='preprocess', action='store_true', help='preprocess the data (rotate, crop, and identify dlib landmarks) for data set 5')
-	parser.add_argument('--evaluate', dest='evaluate', action='store_true', help='evaluate data set 5 with the algorithms')
-	parser.add_argument('--algorithm', dest='algorithm', type=str, nargs='+', default=['thirds','fifths','golden'], help='a string algorithm name to perform (thirds, fifths, and/or golden)')
-	parser.add_argument('--contestant', dest='contestant', type=str, nargs='+', default=[], help='a string contestant first and last name separated by "_" (i.e. joelle_fletcher)')
-	args = parser.parse_args()
-
-	# Initialize multiprocessing pool with 5 threads
-	pool = Pool(processes=5)
+'''
+Preprocess contestants' photos on the pool, journaling each record as soon as its face is preprocessed
+Returns the ids of contestants whose photos could not be preprocessed (or failed or timed out every attempt)
+'''
+def preprocess_all(pool, ids, ds, ds5_journal, window, chunksize, cache=None, timeout=0, retries=0):
+	failed = []
+	errors = []
+	done = 0
+	# Reuse the records of photos already preprocessed with the same models and settings, and only send the rest to the pool
+	keys = {}
+	if cache is not None:
+		keys = {id: key for id, key in ((id, preprocess_key(id, ds)) for id in ids) if key}
+		cached = cache.get_many('preprocess', keys.values())
+		for id in ids:
+			if keys.get(id) in cached:
+				done += 1
+				record = cached[keys[id]]
+				if len(record) > 0:
+					record.update(id=id, name=photo_source(ds)[id][0])
+					ds5_journal.append(id, [record])
+				else:
+					failed.append(id)
+		ids = [id for id in ids if keys.get(id) not in cached]
+	tasks = ((id, ds) for id in ids)
+	total = done + len(ids)
+	# Only start the pool if there are photos left to preprocess
+	results = imap_unordered(pool.get(len(ids)), process_id, tasks, window, chunksize, timeout, retries, errors) if len(ids) > 0 else []
+	for id, record in results:
+		done += 1
+		if id in keys:
+			cache.put('preprocess', keys[id], record)
+		if len(record) > 0:
+			ds5_journal.append(id, [record])
+		else:
+			failed.append(id)
+		# Report progress as results arrive
+		if done % 25 == 0 or done == total:
+			print(f'  ⏳ {done}/{total} photos preprocessed ({done - len(failed)} faces found)')
+	# Report photos that failed or timed out every attempt instead of stalling the run
+	for (id, ds), error in errors:
+		print(f'  💔 {id} (data set {ds}): {error}')
+		telemetry.count('items_failed', stage='preprocess')
+		failed.append(id)
+	return failed
+
+'''
+Work queue mode: --enqueue fills a SQLite work queue (on the shared volume) with a preprocessing task per
+contestant or evaluation tasks over batches of data set 5, any number of --worker processes (in any number
+of containers or hosts) claim and run the tasks, and --compact saves their results to data set 5
+'''
+# Task kinds run by workers
+QUEUE_KINDS = ['preprocess', 'evaluate']
+
+# Number of data set 5 contestants evaluated per evaluation task
+EVALUATE_BATCH = 500
+
+def enqueue_preprocess(workqueue, ids, ds=3):
+	return workqueue.enqueue('preprocess', [(f'{id}:{ds}', {'id': id, 'ds': ds}) for id in ids])
+
+def enqueue_evaluate(workqueue, ids, algorithms):
+	ids = list(ids)
+	batches = [ids[i:i + EVALUATE_BATCH] for i in range(0, len(ids), EVALUATE_BATCH)]
+	return workqueue.enqueue('evaluate', [(f'''{batch_ids[0]}:{len(batch_ids)}:{','.join(algorithms)}''', {'ids': batch_ids, 'algorithms': algorithms}) for batch_ids in batches])
+
+def run_task(workqueue, bachmodel, task, cache=None):
+	# Run a claimed task and return its (json serializable) result
+	payload = task['payload']
+	if task['kind'] == 'preprocess':
+		id = payload['id']
+		hit, record = cached_record(cache, id, payload['ds'])
+		if not hit:
+			id, record = process_id(id, payload['ds'])
+			key = preprocess_key(id, payload['ds'])
+			if cache is not None and key:
+				cache.put('preprocess', key, record)
+		if len(record) > 0:
+			return record
+		# Fall back to the contestant's Instagram profile picture if their headshot couldn't be preprocessed
+		if payload['ds'] == 3 and id in photo_source(4):
+			enqueue_preprocess(workqueue, [id], 4)
+		return None
+	if task['kind'] == 'evaluate':
+		df5 = bachmodel.retrieve_df(5, columns=['id', 'face_photo', 'face_height', 'face_width'], landmarks=False)
+		selected = df5.set_index('id').loc[payload['ids']].reset_index()
+		landmarks, valid = bachmodel.landmarks(selected['id'], selected['face_photo'], valid=True)
+		results, timings = evaluate_faces(selected, payload['algorithms'], landmarks, cache, valid)
+		return results.to_dict('records')
+	raise ValueError(f'''unknown task kind {task['kind']}''')
+
+# Exit code of a worker process that exits to be replaced by a fresh one (after running max_tasks tasks)
+RECYCLE_EXIT = 75
+
+def run_worker(queue_path, lease, attempts, cache_path=None, timeout=0, max_tasks=0, poll=5):
+	# Claim and run tasks until no task is pending or leased (a leased task is claimed again if its worker dies)
+	# Each task runs within a deadline of timeout seconds, and the worker exits with RECYCLE_EXIT after max_tasks tasks
+	workqueue = model.workqueue(queue_path, lease, attempts)
+	cache = model.result_cache(cache_path) if cache_path else None
+	bachmodel = model.bachmodel(PATH_TO_VOLUME)
+	owner = model.worker_name()
+	done = 0
+	while True:
+		task = workqueue.claim(owner, QUEUE_KINDS)
+		if task is None:
+			counts = workqueue.counts(QUEUE_KINDS)
+			if counts['pending'] == 0 and counts['leased'] == 0:
+				break
+			time.sleep(poll)
+			continue
+		# Heartbeat the task's lease while it runs, but no longer than its deadline (and the grace period before a stuck
+		# worker exits), so a hung task's lease still expires
+		with model.keepalive(workqueue, task, owner, timeout + DEADLINE_GRACE):
+			try:
+				with telemetry.timer(f'''queue:{task['kind']}'''), deadline(timeout):
+					result = run_task(workqueue, bachmodel, task, cache)
+				if not workqueue.complete(task, owner, result):
+					print(f'''  ⚠️ Lost the lease on {task['kind']} task {task['key']}; its result was discarded''')
+			except Exception as e:
+				print(f'''  💔 {task['kind']} task {task['key']} (attempt {task['attempts']}): {e}''')
+				telemetry.count('items_failed', stage=f'''queue:{task['kind']}''')
+				workqueue.fail(task, owner, e, backoff(task['attempts'] - 1))
+		done += 1
+		if done % 25 == 0:
+			print(f'  ⏳ {owner}: {done} tasks run')
+		if max_tasks and done >= max_tasks:
+			break
+	print(f'  ⏳ {owner}: {done} tasks run')
+	if cache is not None:
+		cache.report()
+		cache.close()
+	workqueue.close()
+	telemetry.flush(force=True)
+	if max_tasks and done >= max_tasks:
+		sys.exit(RECYCLE_EXIT)
+
+def supervise(workers, target, args, max_crashes):
+	# Run worker processes until they all finish, replacing workers that are recycled or that crash (i.e. exit when
+	# stuck past a deadline) while the queue still has work, up to max_crashes crashes
+	processes = [Process(target=target, args=args) for _ in range(workers)]
+	for process in processes:
+		process.start()
+	crashes = 0
+	while processes:
+		time.sleep(1)
+		for process in [process for process in processes if not process.is_alive()]:
+			processes.remove(process)
+			if process.exitcode == 0:
+				continue
+			if process.exitcode != RECYCLE_EXIT:
+				crashes += 1
+				print(f'  💔 Worker {process.pid} exited with code {process.exitcode}')
+				if crashes > max_crashes:
+					print(f'  💔 Not replacing workers after {crashes} crashes')
+					continue
+			replacement = Process(target=target, args=args)
+			replacement.start()
+			processes.append(replacement)
+
+def compact_queue(workqueue, bachmodel, evaluate, algorithms):
+	# Save the results of finished preprocessing tasks as data set 5 (and enqueue its evaluation), then merge the results of finished evaluation tasks into data set 5
+	for kind in QUEUE_KINDS:
+		counts = workqueue.counts([kind])
+		if counts['done'] + counts['failed'] == 0:
+			continue
+		if counts['pending'] + counts['leased'] > 0:
+			print(f'''  ⚠️ {counts['pending'] + counts['leased']} {kind} tasks are unfinished; run workers before compacting them''')
+			continue
+		for key, error in workqueue.failures(kind):
+			print(f'  💔 {kind} task {key} failed: {error}')
+		if kind == 'preprocess':
+			df5 = pd.DataFrame([record for key, record in workqueue.results(kind) if record])
+			print(f'🌹 Saving {len(df5.index)} preprocessed contestants to data set 5')
+			if not bachmodel.save_df(df5, 5):
+				continue
+			if evaluate and not df5.empty:
+				added = enqueue_evaluate(workqueue, df5['id'], algorithms)
+				print(f'  🌹 Enqueued {added} evaluation tasks; run workers and compact again to evaluate data set 5')
+		else:
+			results = pd.DataFrame([row for key, rows in workqueue.results(kind) for row in rows])
+			df5 = bachmodel.retrieve_df(5, landmarks=False)
+			if df5.empty or results.empty:
+				continue
+			print(f'🌹 Merging evaluations of {len(results.index)} contestants into data set 5')
+			if not bachmodel.save_df(merge_results(df5, results), 5):
+				continue
+		workqueue.remove(kind)
+
+def main(args=None):
+	# Retrieve args (see bach.py)
+	if args is None:
+		args = bach.parse_args(['transform', *sys.argv[1:]])
+	queue_path = args.queue if args.queue else os.path.join(PATH_TO_VOLUME, 'queue.sqlite3')
+
+	# Report per-stage metrics to the volume while transforming
+	metrics = telemetry.reporter(PATH_TO_VOLUME).start()
 
 	# Initialize data model handler object
 	bachmodel = model.bachmodel(PATH_TO_VOLUME)
 
+	# Cache of preprocessed records and algorithm results, keyed by hashes of their inputs
+	cache_path = None if args.no_cache else os.path.join(PATH_TO_VOLUME, 'results.sqlite3')
+	cache = model.result_cache(cache_path) if cache_path else None
+
 	# Initialize dataframe variable
 	df5 = None
 
@@ -302,115 +610,96 @@ def main():
 	elif not args.preprocess and args.evaluate:
 		preprocess = False
 		evaluate = True
+	algorithms = [algorithm for algorithm in batch.ALGORITHMS if algorithm in args.algorithm]
+
+	# Work queue mode
+	if args.enqueue or args.worker or args.compact:
+		workqueue = model.workqueue(queue_path, args.lease, args.attempts)
+		if args.enqueue:
+			# Preprocessing is enqueued by default; evaluation tasks are enqueued when data set 5 is compacted (or with only --evaluate)
+			if preprocess:
+				ids = list(photo_source(3).keys())
+				if len(args.contestant) > 0:
+					names = [' '.join(name.capitalize() for name in contestant.lower().split('_')[:2]) for contestant in args.contestant]
+					ids = [id for id, (name, photo) in photo_source(3).items() if name in names]
+				print(f'🌹 Enqueued {enqueue_preprocess(workqueue, ids)} preprocessing tasks')
+			else:
+				df5 = bachmodel.retrieve_df(5, columns=['id'], landmarks=False)
+				ids = [] if df5.empty else df5['id']
+				print(f'🌹 Enqueued {enqueue_evaluate(workqueue, ids, algorithms)} evaluation tasks')
+		if args.worker and args.timeout <= 0:
+			# Without a deadline, a hung task would be heartbeated forever and never handed to another worker
+			print('  💔 Workers need a positive --timeout, so that the leases of hung tasks expire')
+		elif args.worker:
+			# Load the pre-trained models and data set 3 once, then fork worker processes that share them
+			print('🌹 Loading pre-trained models')
+			models = ['predictor', *detectors.BACKENDS[args.detector].models]
+			registry.load_all(names=models)
+			init_worker(models, args.working_size, args.detector)
+			print(f'🌹 Running {args.workers} workers on {queue_path}')
+			supervise(args.workers, run_worker, (queue_path, args.lease, args.attempts, cache_path, args.timeout, args.max_tasks_per_child), args.workers * args.attempts)
+		if args.compact:
+			compact_queue(workqueue, bachmodel, evaluate, algorithms)
+		print(f'''  📈 Work queue: {', '.join(f'{count} {state}' for state, count in workqueue.counts().items())}''')
+		workqueue.close()
+		if cache is not None:
+			cache.close()
+		metrics.stop()
+		return
 
 	# If the user wants to preprocess the data
 	if preprocess:
+		# The pool (and the pre-trained models) are only loaded if a photo isn't cached
+		configure(args.working_size, args.detector)
+		pool = lazy_pool(args.workers, args.working_size, args.detector, args.max_tasks_per_child)
+		window = args.window if args.window > 0 else 2 * args.workers
+		# Journal records as they're preprocessed, so results aren't held in memory until every photo is done
+		ds5_journal = model.journal(PATH_TO_VOLUME, 5)
+		ds5_journal.reset()
+
 		print('🌹 Preprocessing data for data set 5')
+		ds3_photos = photo_source(3)
 		# If no contestants are given by the user, process every contestant from data set 3 in the database
 		if len(args.contestant) == 0:
-			# Read-in ds3 as dataframe
-			df3 = bachmodel.retrieve_df(3)
-			if not df3.empty:
-				# Retrieve list of contestants
-				contestants = df3[['id', 'name', 'photo']].values.tolist()
-			if len(contestants) == 0:
+			# Retrieve list of contestants
+			ids = list(ds3_photos.keys())
+			if len(ids) == 0:
 				print(f'  💔 Unable to compile data set 5. Has data set 3 been collected and stored?')
 		else:
-			# Read-in ds3 as dataframe
-			df3 = bachmodel.retrieve_df(3)
-			if not df3.empty:
-				contestants = []
-				for contestant in args.contestant:
-					names = contestant.lower().split('_')
-					name = f'''{names[0][0].upper()}{names[0][1:].lower()} {names[1][0].upper()}{names[1][1:].lower()}'''
-					# Get contestant's id, name, and photo
-					contestant = df3.loc[df3['name']==name][['id', 'name', 'photo']].values.tolist()
-					if len(contestant) > 0:
-						contestants += contestant
+			ids = []
+			for contestant in args.contestant:
+				names = contestant.lower().split('_')
+				name = f'''{names[0][0].upper()}{names[0][1:].lower()} {names[1][0].upper()}{names[1][1:].lower()}'''
+				# Get contestant's id
+				ids += [id for id, (contestant_name, photo) in ds3_photos.items() if contestant_name == name]
 		# Multiprocess rotating, cropping, and finding facial landmarks of contestants' faces via their photos
-		ds5_resp = pool.starmap_async(process_face, contestants)
-		# Separate good and empty response records
-		ds5_recs = []
-		ds5_null = []
-		for resp in ds5_resp.get():
-			if len(resp[1]) > 0:
-				ds5_recs.append(resp[1])
-			else:
-				ds5_null.append(resp[0])
+		ds5_null = preprocess_all(pool, ids, 3, ds5_journal, window, args.chunksize, cache, args.timeout, args.retries)
 		# Attempt to retrieve and preprocess Instagram profile pictures from the contestants whose headshots from the show were not preprocessed successfully
 		if len(ds5_null) > 0:
-			# Load data set 4
-			df4 = bachmodel.retrieve_df(4)
-			if not df4.empty:
-				contestants = []
-				for id in ds5_null:
-					contestant = df4.loc[df4['id']==id][['id', 'name', 'prof_photo']].values.tolist()
-					if len(contestant) > 0:
-						contestants.append(contestant[0])
-				# Multiprocess preprocessing again
-				ds5_resp = pool.starmap_async(process_face, contestants)
-				ds5_recs += [resp[1] for resp in list(ds5_resp.get()) if len(resp[1])>0]
-		df5 = pd.DataFrame(ds5_recs)
-		# Save data set 5
-		bachmodel.save_df(df5, 5)
-
-	# Perform algorithms if specified
-	if evaluate:
-		# If data set 5 hasn't been read-in to a dataframe, attempt to read data set 5 from pickled file
-		if not isinstance(df5, pd.DataFrame):
-			df5 = bachmodel.retrieve_df(5)
-		if not df5.empty:
-			# If no contestants are given by the user, retrieve all pre-processed document ids (contestant names) from the database
-			if len(args.contestant) == 0:
-				# Retrieve contestants' ids, name, face, and dlib landmarks
-				contestants = df5[['id', 'name', 'face_photo', 'dlib_landmarks']].values.tolist()
-				if len(contestants) == 0:
-					print(f'  💔 Unable to evaluate rule of thirds. Has data set 5 been collected, preprocessed, and stored?')
+			# Load data set 4 (workers open it themselves)
+			ds4_photos = photo_source(4)
+			ids = [id for id in ds5_null if id in ds4_photos]
+			# Multiprocess preprocessing again
+			preprocess_all(pool, ids, 4, ds5_journal, window, args.chunksize, cache, args.timeout, args.retries)
+		pool.close()
+		# Save data set 5 and discard the journal once it's saved
+		ds5_journal.close()
+		df5 = ds5_journal.dataframe()
+		if bachmodel.save_df(df5, 5):
+			if ds5_journal.skipped > 0:
+				print(f'  💔 {ds5_journal.skipped} journal entries could not be read; the journal is kept')
 			else:
-				for contestant in args.contestant:
-					names = contestant.lower().split('_')
-					name = f'''{names[0][0].upper()}{names[0][1:].lower()} {names[1][0].upper()}{names[1][1:].lower()}'''
-					# Get contestant's id, name, face, and dlib landmarks
-					contestant = df5.loc[df5['name']==name][['id', 'name', 'face_photo', 'dlib_landmarks']].values.tolist()
-		# Rule of thirds
-		if 'thirds' in args.algorithm:
-			print('🌹 Evaluating the Rule of Thirds')
-			# Multiprocess
-			ds5_resp = pool.starmap_async(eval_rule_of_thirds, contestants)
-			# Update data set 5 dataframe
-			for resp in ds5_resp.get():
-				id = resp[0]
-				rec = resp[1]
-				for key, value in rec.items():
-					df5.loc[df5['id'] == id, [key]] = value
-			# Save data set 5
-			bachmodel.save_df(df5, 5)
-		# Rule of fifths
-		if 'fifths' in args.algorithm:
-			print('🌹 Evaluating the Rule of Fifths')
-			# Multiprocess
-			ds5_resp = pool.starmap_async(eval_rule_of_fifths, contestants)
-			# Update data set 5 dataframe
-			for resp in ds5_resp.get():
-				id = resp[0]
-				rec = resp[1]
-				for key, value in rec.items():
-					df5.loc[df5['id'] == id, [key]] = value
-			# Save data set 5
-			bachmodel.save_df(df5, 5)
-		# Golden ratio
-		if 'golden' in args.algorithm:
-			print('🌹 Evaluating the Golden Ratio')
-			# Multiprocess
-			ds5_resp = pool.starmap_async(eval_golden_ratio, contestants)
-			# Update data set 5 dataframe
-			for resp in ds5_resp.get():
-				id = resp[0]
-				rec = resp[1]
-				for key, value in rec.items():
-					df5.loc[df5['id'] == id, [key]] = value
-			# Save data set 5
-			bachmodel.save_df(df5, 5)
+				ds5_journal.remove()
+
+	# Perform algorithms if specified (reading data set 5 from storage unless it was just preprocessed)
+	if evaluate:
+		evaluate_all(bachmodel, algorithms, args.contestant, cache, df5)
+
+	# Report how much work the cache saved
+	if cache is not None:
+		cache.report()
+		cache.close()
+	metrics.stop()
 
 if __name__ == '__main__':
 	main()
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+'''
+Face detector backends used to find contestants' faces before landmarking
+
+Each backend yields the faces it finds in a BGR photo as ((x, y, w, h), verified) pairs, in the
+order they should be tried, lazily, so that verification stops at the first verified face
+    * cascade: Haar frontal face cascade, verified by finding a mouth and an eye within the face
+    * hog: dlib's HOG frontal face detector (its detections need no further verification)
+    * dnn: OpenCV's DNN face detector (ResNet-10 SSD), keeping detections above a confidence threshold
+'''
+
+from . import registry
+import numpy as np
+import telemetry
+import cv2
+
+class cascade():
+    # Models loaded from the registry
+    models = ['face', 'mouth', 'eye']
+
+    def faces(self, img, verify=True):
+        # Retrieve pre-trained classifiers
+        face_cascade = registry.get('face')
+        mouth_cascade = registry.get('mouth')
+        eye_cascade = registry.get('eye')
+        # Convert to grayscale
+        img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        # Apply a Gaussian blur with a 3 x 3 kernel to help remove high frequency noise
+        img_gauss = cv2.GaussianBlur(img_gray,(3,3), 0)
+        # Detect faces
+        # https://stackoverflow.com/questions/20801015/recommended-values-for-opencv-detectmultiscale-parameters
+        with telemetry.timer('face_detection'):
+            faces = face_cascade.detectMultiScale(img_gauss, scaleFactor=1.05, minNeighbors=6, minSize=(20,20), flags=cv2.CASCADE_SCALE_IMAGE)
+        for face in faces:
+            (x, y, w, h) = face
+            if not verify:
+                yield face, False
+                continue
+            # Get face image
+            face_img = img_gauss[y:y+h, x:x+w]
+            # Detect a mouth
+            with telemetry.timer('mouth_verification'):
+                mouth = mouth_cascade.detectMultiScale(face_img, scaleFactor=1.05, minNeighbors=6)
+            if len(mouth) == 0:
+                telemetry.count('faces_rejected', gate='mouth')
+                yield face, False
+                continue
+            # Detect eyes JUST for second check that detected face is truly a face
+            with telemetry.timer('eye_verification'):
+                eyes = eye_cascade.detectMultiScale(face_img, scaleFactor=1.05, minNeighbors=1)
+            if len(eyes) == 0:
+                telemetry.count('faces_rejected', gate='eyes')
+            yield face, len(eyes) > 0
+
+class hog():
+    models = ['hog']
+
+    def __init__(self, upsample=0):
+        # Number of times to upsample the photo (to find faces smaller than ~80 x 80 pixels)
+        self.upsample = upsample
+
+    def faces(self, img, verify=True):
+        detector = registry.get('hog')
+        img_gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        with telemetry.timer('face_detection'):
+            rects = detector(img_gray, self.upsample)
+        for rect in rects:
+            # Clip to the photo and convert the dlib rectangle to cv2 coordinates
+            x, y = max(0, rect.left()), max(0, rect.top())
+            w, h = min(img.shape[1], rect.right()) - x, min(img.shape[0], rect.bottom()) - y
+            yield np.array([x, y, w, h]), True
+
+class dnn():
+    models = ['dnn']
+
+    def __init__(self, confidence=0.5):
+        # Minimum confidence of a detection
+        self.confidence = confidence
+
+    def faces(self, img, verify=True):
+        net = registry.get('dnn')
+        h, w = img.shape[:2]
+        # The network expects a 300 x 300 photo with the training set's mean color subtracted
+        blob = cv2.dnn.blobFromImage(cv2.resize(img, (300, 300)), 1.0, (300, 300), (104.0, 177.0, 123.0))
+        with telemetry.timer('face_detection'):
+            net.setInput(blob)
+            detections = net.forward()
+        # Each detection is (image id, label, confidence, left, top, right, bottom) scaled to 0-1
+        for detection in sorted(detections[0, 0], key=lambda detection: -detection[2]):
+            if detection[2] < self.confidence:
+                break
+            left, top, right, bottom = np.clip(detection[3:7], 0, 1) * [w, h, w, h]
+            yield np.array([left, top, right - left, bottom - top]).astype(int), True
+
+BACKENDS = {
+    'cascade': cascade,
+    'hog': hog,
+    'dnn': dnn
+}
+
+def get(name):
+    # Return a detector of the named backend
+    return BACKENDS[name]()
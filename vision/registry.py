@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+
+'''
+Process-wide registry of the pre-trained models used to preprocess contestant photos
+
+Loading the dlib shape predictor (~100 MB) and the Haar cascades is far more expensive than
+using them, so each model is loaded at most once per process. Load the registry in the parent
+before creating a multiprocessing pool so that forked workers share the models copy-on-write,
+or pass init_worker as the pool initializer so that each worker loads them exactly once.
+'''
+
+import resource
+import hashlib
+import time
+import os
+
+# Path to dlib shape predictor from http://dlib.net/files/shape_predictor_68_face_landmarks.dat.bz2
+PREDICTOR_PATH = '/usr/bin/shape_predictor_68_face_landmarks.dat'
+
+# Paths to OpenCV's DNN face detector (ResNet-10 SSD) from https://github.com/opencv/opencv/tree/master/samples/dnn/face_detector
+DNN_CONFIG_PATH = '/usr/share/face_detector/deploy.prototxt'
+DNN_MODEL_PATH = '/usr/share/face_detector/res10_300x300_ssd_iter_140000.caffemodel'
+
+# Haar cascade file names (relative to cv2.data.haarcascades)
+CASCADES = {
+    'face': 'haarcascade_frontalface_default.xml',
+    'mouth': 'haarcascade_mcs_mouth.xml',
+    'eye': 'haarcascade_eye.xml'
+}
+
+# Loaded models and their load statistics, keyed by model name
+_models = {}
+_stats = {}
+_versions = {}
+
+def _rss_mb():
+    # Current resident set size of this process (the second field of /proc/self/statm, in pages)
+    try:
+        with open('/proc/self/statm', 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2**20
+    except (OSError, ValueError):
+        # Without /proc, fall back to the peak resident set size (ru_maxrss is reported in kilobytes on Linux)
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _load(name):
+    if name == 'predictor':
+        import dlib
+        return dlib.shape_predictor(PREDICTOR_PATH)
+    elif name in CASCADES:
+        import cv2
+        return cv2.CascadeClassifier(f'{cv2.data.haarcascades}{CASCADES[name]}')
+    elif name == 'hog':
+        import dlib
+        return dlib.get_frontal_face_detector()
+    elif name == 'dnn':
+        import cv2
+        if not os.path.exists(DNN_MODEL_PATH):
+            raise FileNotFoundError(f'{DNN_MODEL_PATH} not found')
+        return cv2.dnn.readNetFromCaffe(DNN_CONFIG_PATH, DNN_MODEL_PATH)
+    raise KeyError(f'Unknown model {name}')
+
+def get(name):
+    # Return the named model, loading it on first use in this process
+    if name not in _models:
+        rss_before = _rss_mb()
+        start = time.perf_counter()
+        _models[name] = _load(name)
+        _stats[name] = {
+            'pid': os.getpid(),
+            'load_seconds': time.perf_counter() - start,
+            'rss_mb': _rss_mb() - rss_before
+        }
+    return _models[name]
+
+def model_files(name):
+    # Return the files a model is loaded from (the HOG detector is built into dlib)
+    if name == 'predictor':
+        return [PREDICTOR_PATH]
+    elif name in CASCADES:
+        import cv2
+        return [f'{cv2.data.haarcascades}{CASCADES[name]}']
+    elif name == 'dnn':
+        return [DNN_CONFIG_PATH, DNN_MODEL_PATH]
+    return []
+
+def version(name):
+    # Return a hash identifying the named model's weights (computed at most once per process), so that
+    # cached results are invalidated when a model file is replaced
+    if name not in _versions:
+        h = hashlib.sha256(name.encode('utf-8'))
+        if name == 'hog':
+            import dlib
+            h.update(dlib.__version__.encode('utf-8'))
+        for path in model_files(name):
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1 << 20), b''):
+                    h.update(block)
+        _versions[name] = h.hexdigest()
+    return _versions[name]
+
+def load_all(verbose=True, names=None):
+    # Load the given models (the predictor and cascades by default) and report the cost of doing so
+    for name in names if names else ['predictor', *CASCADES.keys()]:
+        loaded = name in _models
+        get(name)
+        if verbose and not loaded:
+            print(f'''  🧠 Loaded {name} in {_stats[name]['load_seconds']:.2f}s (+{_stats[name]['rss_mb']:.1f} MB resident)''')
+    return stats()
+
+def init_worker(names=None):
+    # Pool initializer: a no-op for models already inherited from the parent process
+    load_all(verbose=False, names=names)
+
+def stats():
+    # Return a copy of the load statistics along with the current peak resident memory
+    return {
+        'models': {name: dict(stat) for name, stat in _stats.items()},
+        'rss_mb': _rss_mb()
+    }